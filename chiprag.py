@@ -1,10 +1,11 @@
 """
 Entrypoint of chipRAG.
 
-Provides a command-line interface (CLI) with three subcommands:
+Provides a command-line interface (CLI) with four subcommands:
 - 'comp': Generate a comparison between Chinese and European MRLs.
 - 'doc': Upload a Chinese pesticide residue document.
 - 'eu' : Update pesticide data from the European DataLake.
+- 'db' : Create and maintain the indexes chipRAG relies on.
 
 Each subcommand accepts its own set of arguments, as described in the help output.
 """
@@ -18,6 +19,7 @@ import logging
 from chiprag.document_uploader import upload_document
 from chiprag.comparison_creater import create_comparison
 from chiprag.eu_data_updater import update_eu_data
+from chiprag.database_migrator import migrate_database
 
 
 def main():
@@ -34,38 +36,52 @@ def main():
     comp_parser = subparsers.add_parser("comp", help="Create comparison between Chinese and EU MRLs")
     comp_parser.add_argument("keywords", nargs="+", help="Keywords like pesticide/food names to compare")
     comp_parser.add_argument("--output_path", default="output.xlsx", help="Path where the excel output should be saved to. Defaults to \"output.xlsx\" in the working directory")
+    comp_parser.add_argument("--ranked", action="store_true", help="Process the Chinese chapters matching the keywords best first. Requires the indexes created by the \"db\" command")
+    comp_parser.add_argument("--phased", action="store_true", help="Finish each step for all pesticides before starting the next one, instead of moving every pesticide on as soon as it's ready")
 
     # chinese document upload sub-command
     cu_parser = subparsers.add_parser("doc", help="Upload Chinese pesticide document")
     cu_parser.add_argument("document", type=str, help="Path to PDF document which is to be scanned in")
     cu_parser.add_argument("document_version", type=str, help="Version of the document, following the style of \"GB2021-001\", \"GB2021-002\", \"GB2022-001\"...")
-    cu_parser.add_argument("begin_outline", type=int, help="First page where the outline in which pesticides are listed begins")
-    cu_parser.add_argument("end_outline", type=int, help="Last page which holds the outline in which the pesticides are listed")
-    cu_parser.add_argument("begin_tables", type=int, help="First page which holds information/tables relevant to you")
-    cu_parser.add_argument("end_tables", type=int, help="Last page which holds information/tables relevant to you.")
-    cu_parser.add_argument("pest_chapter_number", type=int, help="Chapter number with which pesticide sections begin. For example 4 for \"4.15 Zo\"")
+    cu_parser.add_argument("pages", type=int, nargs="*", help="Optional, either \"pest_chapter_number\" or \"begin_outline end_outline begin_tables end_tables pest_chapter_number\". Page numbers are only needed for documents without bookmarks. pest_chapter_number defaults to 4")
+    cu_parser.add_argument("--workers", type=int, default=1, help="Number of processes extracting the text and parsing the MRL tables of the pages in parallel. Defaults to 1")
 
     # EU data update sub-command
-    subparsers.add_parser("eu", help="Update EU pesticide data")
+    eu_parser = subparsers.add_parser("eu", help="Update EU pesticide data")
+    eu_parser.add_argument("--full", action="store_true", help="Replace all stored EU data instead of only writing the rows which changed since the last update, also if the EU data didn't change")
+    eu_parser.add_argument("--offline", action="store_true", help="Rebuild the EU data from the local snapshot of the last update instead of the EU DataLake")
+    eu_parser.add_argument("--force", action="store_true", help="Download and store the EU data even if it didn't change since the last update")
+
+    # database migration sub-command
+    db_parser = subparsers.add_parser("db", help="Create and maintain the database indexes chipRAG relies on")
+    db_parser.add_argument("--reindex", action="store_true", help="Additionally rebuild the indexes and refresh the table statistics, e.g. after uploading new documents")
+    db_parser.add_argument("--rename-pesticides", action="store_true", help="Collapse the whitespace in the pesticide names of chapters uploaded by earlier versions, merging names which only differ in whitespace. Can't be undone")
 
     args = parser.parse_args()
 
     if args.command == "comp":
-        create_comparison(keywords=args.keywords, output_path=args.output_path)
+        create_comparison(keywords=args.keywords, output_path=args.output_path, ranked=args.ranked, pipelined=not args.phased)
 
     elif args.command == "doc":
+        if len(args.pages) not in (0, 1, 5):
+            cu_parser.error(f"expected 0, 1 or 5 numbers after the document version, got {len(args.pages)}")
+        begin_outline, end_outline, begin_tables, end_tables = args.pages[:4] if len(args.pages) == 5 else (None,) * 4
         upload_document(
             document=args.document,
             document_version=args.document_version,
-            begin_outline=args.begin_outline,
-            end_outline=args.end_outline,
-            begin_tables=args.begin_tables,
-            end_tables=args.end_tables,
-            pest_chapter_number=args.pest_chapter_number
+            begin_outline=begin_outline,
+            end_outline=end_outline,
+            begin_tables=begin_tables,
+            end_tables=end_tables,
+            pest_chapter_number=args.pages[-1] if args.pages else 4,
+            workers=args.workers
         )
 
     elif args.command == "eu":
-        update_eu_data()
+        update_eu_data(full_reload=args.full, offline=args.offline, force=args.force)
+
+    elif args.command == "db":
+        migrate_database(reindex=args.reindex, rename_pesticides=args.rename_pesticides)
 
 
 if __name__ == "__main__":
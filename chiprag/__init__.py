@@ -1,3 +1,4 @@
 from .eu_data_updater import update_eu_data
 from .comparison_creater import create_comparison
 from .document_uploader import upload_document
+from .database_migrator import migrate_database
@@ -1,4 +1,8 @@
-from .chunker import chunk_report_by_sections
-from .eu_data_tools import eu_fetch_api, get_fitting_pesticides
-from .loader import load_pesticide_chapters, load_pesticide_names_from_outline
-from .prompter import extract_relevant_values, compare_values
+from .chunker import chunk_report_by_sections, iter_report_sections, chunk_mrl_tables
+from .eu_data_tools import eu_fetch_api, get_fitting_pesticides, get_pesticide_prompt_hash
+from .eu_snapshot import load_snapshot, load_snapshot_metadata, save_snapshot
+from .loader import PDFSession, load_pesticide_chapters, iter_pesticide_chapter_pages, load_pesticide_names_from_outline, load_pesticide_toc, load_mrl_tables
+from .prompter import extract_relevant_values, compare_values, compare_pesticide_values, build_comparison, ComparisonRows
+from .llm_cache import cached_completion, log_cache_stats
+from .llm_client import get_llm_client, log_client_stats
+from .food_matcher import match_foods, normalize_food_name
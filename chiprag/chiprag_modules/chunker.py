@@ -7,8 +7,13 @@ for Pesticides in Foods," published by the United States Department of Agricultu
 the translation of document `GB 2763-2021`, but it should work similarly for related reports of the same kind.
 """
 import logging
+import numpy as np
 import pandas as pd
 import re
+from collections.abc import Iterable, Iterator
+
+# code points `str.isspace()` and `\s` treat as whitespace, the last one is U+3000 (ideographic space)
+_WHITESPACE_CODE_POINTS = np.array([c for c in range(0x3001) if chr(c).isspace()], dtype=np.uint32)
 
 
 def chunk_report_by_sections(
@@ -40,59 +45,245 @@ def chunk_report_by_sections(
         raise TypeError("'pesticide_list' must be a list of strings")
 
     ## chunking text into sections
-    # these serve as the "heading" of a certain chapter
-    pesticides = []  
-    # consists of: heading, general informations, maximum residue tables
-    chapter_content = []  
-    remaining_text = text
-
-    for pesticide in pesticide_list:
-        # building regex pattern
-        escaped_pesticide = [re.escape(c) for c in pesticide if not c.isspace()]
-        pattern = r'\s*'.join(escaped_pesticide)
-        regex = re.compile(pattern)
-        # match current regex pattern made out of pesticide against the text
-        match = regex.search(remaining_text)
-        if match:
-            chapter_start_idx = match.start()
-            # extract text
-            text_before_idx = remaining_text[:chapter_start_idx]
-            # adapt remaining text
-            remaining_text = remaining_text[chapter_start_idx:]
-            # add to text column
-            chapter_content.append(text_before_idx)
-
-            # if exist(!), clean pesticide before adding by removing parantheses, brackets and chapter numbers
-            if re.search(r'([\(\[].*?[\)\]])\s*$', pesticide) != None:
-                pesticide_str = re.search(r'([\(\[].*?[\)\]])\s*$', pesticide).group(1) 
-                if pesticide_str[-1]==')':
-                    idx = pesticide_str.rfind('(')
-                elif pesticide_str[-1]==']':
-                    idx = pesticide_str.rfind('[')
-                else: 
-                    logging.info(
-                        "Elements in 'pesticide_list' are expected to contain either parentheses or brackets for chinese characters infront of the english pesticide name.\
-                        Check the current document to determine whether this expectation is outdated or if the regex used is incorrect."
-                    )
-            # add to pesticide column
-                pesticides.append(pesticide_str[idx+1:-1])
-            # if there are no parantheses or brackets just add the heading as is
-            else: 
-                pesticides.append(pesticide)
-        else:  
-            # no match with current pesticide
-            continue
-
-    chapter_content.append(remaining_text)
-    # delete everything (empty string if theres nothing in front) before the first chapter starts
-    del chapter_content[0]
+    sections = list(iter_report_sections([text], pesticide_list))
 
     ## creating DataFrame
     df = pd.DataFrame({
-        "pesticide": pesticides,
-        "text": chapter_content
+        "pesticide": [section[0] for section in sections],
+        "text": [section[1] for section in sections]
     })
     # add version number of the document to each row
     df["version"] = document_version
     
     return df 
+
+
+def iter_report_sections(
+        pages: Iterable[str],
+        pesticide_list: list[str]
+) -> Iterator[tuple[str, str]]:
+    """
+    Streaming variant of `chunk_report_by_sections()`, splits a document given as stream of page texts 
+    into chapters and yields each chapter as soon as the heading of the next one is found.
+
+    Headings are searched one after another, each from the start of the previous one on. Whitespace is 
+    removed from text and headings, so they are found by plain substring searches, even across pages. Only 
+    the text from the start of the current chapter on is kept, unless a heading is missing in the text: 
+    to know that for sure, the rest of the document has to be read.
+
+    Args:
+        pages (Iterable[str]): Text content of the document, e.g. page by page.
+        pesticide_list (list[str]): A list of pesticide names to be matched against headings in the text.
+
+    Returns:
+        Iterator[tuple[str, str]]: Pesticide name and chapter text of each chapter, in order.
+    """
+    pages = iter(pages)
+    # text from the start of the current chapter on, or from the start of the document before the first one
+    buffer = _CompactTextBuffer()
+    pages_left = True
+    # pesticide of the chapter the buffer starts with
+    pesticide_name = None
+
+    for pesticide in pesticide_list:
+        needle = "".join(c for c in pesticide if not c.isspace())
+        compact_search_start = 0
+        match_idx = buffer.find(needle, compact_search_start)
+        while match_idx == -1 and pages_left:
+            # matches have the length of the heading in the compact text, so the text searched so far can only 
+            # hold the beginning of a match at its very end
+            compact_search_start = max(0, buffer.compact_length - len(needle) + 1)
+            page = next(pages, None)
+            if page is None:
+                pages_left = False
+                continue
+            buffer.append(page)
+            match_idx = buffer.find(needle, compact_search_start)
+        if match_idx == -1:
+            # no match with current pesticide
+            continue
+
+        # the current chapter ends where the next one starts, text in front of the first chapter is dropped
+        chapter_text = buffer.drop_before(match_idx)
+        if pesticide_name is not None:
+            yield pesticide_name, chapter_text
+        pesticide_name = _clean_pesticide_name(pesticide)
+
+    # the last chapter reaches until the end of the document
+    if pesticide_name is not None:
+        yield pesticide_name, buffer.text + "".join(pages)
+
+
+def _clean_pesticide_name(
+        pesticide: str
+) -> str:
+    """
+    Helper function that turns a heading of the outline into the name of its pesticide. Runs of whitespace 
+    are collapsed into single spaces, so headings read from the outline pages and from the bookmarks of a 
+    document give the same name.
+
+    Args:
+        pesticide (str): Heading as listed in the outline.
+
+    Returns:
+        str: Name of the pesticide.
+    """
+    # if exist(!), clean pesticide before adding by removing parantheses, brackets and chapter numbers
+    if re.search(r'([\(\[].*?[\)\]])\s*$', pesticide) != None:
+        pesticide_str = re.search(r'([\(\[].*?[\)\]])\s*$', pesticide).group(1) 
+        if pesticide_str[-1]==')':
+            idx = pesticide_str.rfind('(')
+        elif pesticide_str[-1]==']':
+            idx = pesticide_str.rfind('[')
+        else: 
+            logging.info(
+                "Elements in 'pesticide_list' are expected to contain either parentheses or brackets for chinese characters infront of the english pesticide name.\
+                Check the current document to determine whether this expectation is outdated or if the regex used is incorrect."
+            )
+        return " ".join(pesticide_str[idx+1:-1].split())
+    # if there are no parantheses or brackets just add the heading as is
+    return " ".join(pesticide.split())
+
+
+class _CompactTextBuffer:
+    """
+    Growing piece of text, kept together with its whitespace-free form for searching headings.
+    `offsets` maps each character of the compact text to its index in `_text`. Dropped text is only 
+    cut off once it makes up half of the buffer, so dropping doesn't copy the buffer every time.
+    """
+    def __init__(self) -> None:
+        self._text = ""
+        self._compact_text = ""
+        self._offsets = np.zeros(0, dtype=np.int64)
+        # start of the buffer in `_text` and `_compact_text`
+        self._start = 0
+        self._compact_start = 0
+
+    @property
+    def text(self) -> str:
+        return self._text[self._start:]
+
+    @property
+    def compact_length(self) -> int:
+        return len(self._compact_text) - self._compact_start
+
+    def append(
+            self,
+            text: str
+    ) -> None:
+        """
+        Adds text to the end of the buffer.
+
+        Args:
+            text (str): Text to add.
+
+        Returns:
+            None
+        """
+        compact_text, offsets = _compact_whitespace(text)
+        self._offsets = np.concatenate([self._offsets, offsets + len(self._text)])
+        self._compact_text += compact_text
+        self._text += text
+
+    def find(
+            self,
+            needle: str,
+            compact_start: int
+    ) -> int:
+        """
+        Finds the first occurrence of a whitespace-free needle, where the text may contain whitespace 
+        between any of its characters.
+
+        Args:
+            needle (str): Text without whitespace to search for.
+            compact_start (int): Index in the compact text of the buffer to start searching at.
+
+        Returns:
+            int: Index in `text` where the match starts, -1 if there is none. An empty needle matches at 0.
+        """
+        if len(needle) == 0:
+            return 0
+        compact_idx = self._compact_text.find(needle, self._compact_start + compact_start)
+        return -1 if compact_idx == -1 else int(self._offsets[compact_idx]) - self._start
+
+    def drop_before(
+            self,
+            idx: int
+    ) -> str:
+        """
+        Removes everything in front of an index of `text`.
+
+        Args:
+            idx (int): Index in `text` which becomes the start of the buffer.
+
+        Returns:
+            str: The removed text.
+        """
+        dropped_text = self._text[self._start:self._start + idx]
+        self._start += idx
+        self._compact_start = int(np.searchsorted(self._offsets, self._start))
+        if 2 * self._start >= len(self._text):
+            self._text = self._text[self._start:]
+            self._compact_text = self._compact_text[self._compact_start:]
+            self._offsets = self._offsets[self._compact_start:] - self._start
+            self._start = 0
+            self._compact_start = 0
+        return dropped_text
+
+
+def _compact_whitespace(
+        text: str
+) -> tuple[str, np.ndarray]:
+    """
+    Helper function that removes all whitespace from a text and keeps track of where the remaining characters were.
+
+    Args:
+        text (str): Text to compact.
+
+    Returns:
+        tuple[str, np.ndarray]: The text without whitespace, and the index in `text` of each of its characters.
+    """
+    code_points = np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    offsets = np.flatnonzero(~np.isin(code_points, _WHITESPACE_CODE_POINTS))
+    return code_points[offsets].tobytes().decode("utf-32-le", "surrogatepass"), offsets
+
+
+def chunk_mrl_tables(
+        chunk_df: pd.DataFrame,
+        table_df: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Assigns the parsed Maximum Residue Limit tables to the chapters of the pesticides they belong to. 
+    A chapter owns every table it mentions by its title, e.g. "shall meet the requirements of Table 45."
+
+    If a chapter mentions a table which couldn't be parsed, all rows of the chapter are flagged as uncertain.
+
+    Args:
+        chunk_df (pd.DataFrame): Chapters as returned by `chunk_report_by_sections()`.
+        table_df (pd.DataFrame): Table rows as returned by `loader.load_mrl_tables()`.
+
+    Returns:
+        pd.DataFrame: A DataFrame with the columns "pesticide", "food", "category", "mrl", "version" and "uncertain", 
+                      in the order of the document.
+    """
+    ## faulty argument handling
+    if not isinstance(chunk_df, pd.DataFrame) or not isinstance(table_df, pd.DataFrame):
+        raise TypeError("'chunk_df' and 'table_df' must be pd.DataFrames")
+
+    ## tables mentioned by each chapter
+    chapter_tables = chunk_df[["pesticide", "version"]].assign(
+        table=[list(dict.fromkeys(int(number) for number in re.findall(r'\bTable\s*(\d+)\b', text))) for text in chunk_df["text"]]
+    ).explode("table").dropna(subset=["table"])
+    chapter_tables["table"] = chapter_tables["table"].astype(int)
+
+    parsed_tables = table_df.dropna(subset=["table"]).astype({"table": int})
+    # chapters mentioning a table which wasn't parsed can only be extracted partially
+    missing = ~chapter_tables["table"].isin(parsed_tables["table"])
+    if missing.any():
+        logging.warning(f"Couldn't parse tables {chapter_tables.loc[missing, 'table'].tolist()}, their chapters are flagged as uncertain.")
+    incomplete_pesticides = set(chapter_tables.loc[missing, "pesticide"])
+
+    mrl_df = chapter_tables.merge(parsed_tables, on="table", how="inner")
+    mrl_df["uncertain"] = mrl_df["uncertain"].astype(bool) | mrl_df["pesticide"].isin(incomplete_pesticides)
+
+    return mrl_df[["pesticide", "food", "category", "mrl", "version", "uncertain"]]
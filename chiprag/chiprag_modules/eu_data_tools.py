@@ -2,43 +2,235 @@
 Provides functions to fetch data from APIs listed on the EU DataLake (https://developer.datalake.sante.service.ec.europa.eu/apis), clean it, and extract specific information using an LLM.
 """
 import ast
+import codecs
+import hashlib
 import json
-import openai
+import numpy as np
 import pandas as pd
 import requests
+import tempfile
 import yaml
+from collections.abc import Iterable, Iterator
 from config.load_config import settings
-from chiprag.postgres_utils import get_all_pesticides
-from rapidfuzz import fuzz
+from chiprag.postgres_utils import get_eu_reference_index
+from rapidfuzz import fuzz, process
+from .llm_cache import cached_completion, discard_cached_completion
 
 
-def eu_fetch_api() -> tuple[pd.DataFrame, pd.DataFrame]:
+# columns of the EU DataLake dump which are used by chipRAG, everything else is dropped while parsing
+_EU_COLUMNS = ["pesticide_residue_name", "product_code", "product_name", "mrl_value_only", "applicability_text", "application_date"]
+# columns with few distinct values, stored as categoricals to keep the parsed dump compact
+_EU_CATEGORICAL_COLUMNS = ["pesticide_residue_name", "product_code", "product_name", "applicability_text", "application_date"]
+
+
+def eu_fetch_api(
+        batch_size: int = 50000,
+        previous_metadata: dict | None = None
+) -> tuple[pd.DataFrame, pd.DataFrame, dict] | None:
     """
     Fetches all pesticide, product, and MRL data from the EU DataLake.
 
+    The download is streamed and parsed record by record, only the needed columns are kept and collected in 
+    compact, categorical batches which are folded into a single table as they arrive. Memory therefore grows with 
+    the number of records (a few bytes per record and column plus the distinct values) instead of with the size of 
+    the raw dump. The whole table is built before it's cleaned and handed on, as removing duplicates, sorting and 
+    syncing need all records.
     Cleans the retrieved data using the helper function `_eu_clean_data()`.
 
+    If metadata of a previous download is given, the request is made conditional on its ETag/Last-Modified 
+    headers. For servers not supporting those, the download is spooled to a temporary file and its content hash 
+    compared before parsing, so an unchanged dump still costs the download, but not the parsing.
+
+    Args:
+        batch_size (int): Number of records collected before they are turned into a compact batch. Defaults to 50000.
+        previous_metadata (dict | None): Metadata returned by a previous call. Defaults to None, always fetching the data.
+
     Returns:
-        tuple[pd.DataFrame, pd.DataFrame]: A tuple of two DataFrames —
+        tuple[pd.DataFrame, pd.DataFrame, dict] | None: None if the data didn't change since the previous download, 
+            otherwise a tuple of two DataFrames and the metadata of this download —
             the first with currently applicable values,
             the second with values not yet applicable.
             Columns include: "pesticide_residue_name", "product_code", "product_name",
             "mrl_value_only", "applicability_text", "application_date".
+            The metadata holds the keys "etag", "last_modified" and "content_hash".
     """
     headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_5) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/50.0.2661.102 Safari/537.36'}
-    format = "json"
-    language = "EN"
+    previous_metadata = previous_metadata or {}
+    if previous_metadata.get("etag"):
+        headers["If-None-Match"] = previous_metadata["etag"]
+    if previous_metadata.get("last_modified"):
+        headers["If-Modified-Since"] = previous_metadata["last_modified"]
+
+    with requests.get(settings.eu_api_url, headers=headers, stream=True, timeout=(30, 300)) as response:
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        metadata = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified")
+        }
+        # the raw download is hashed while it's spooled to disk, so an unchanged dump is never parsed
+        with tempfile.TemporaryFile() as download:
+            content_hash = hashlib.sha256()
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                content_hash.update(chunk)
+                download.write(chunk)
+            metadata["content_hash"] = content_hash.hexdigest()
+            if metadata["content_hash"] == previous_metadata.get("content_hash"):
+                return None
+            download.seek(0)
+            records = _iter_json_records(iter(lambda: download.read(1024 * 1024), b""))
+            data = _concat_batches(_iter_record_batches(records, batch_size))
+
+    applicable_data, not_yet_applicable_data = _eu_clean_data(data)
+    return applicable_data, not_yet_applicable_data, metadata
+
+
+def _iter_json_records(
+        chunks: Iterable[bytes]
+) -> Iterator[dict]:
+    """
+    Helper function that incrementally decodes a JSON array of objects, yielding one object at a time.
+
+    Args:
+        chunks (Iterable[bytes]): UTF-8 encoded JSON array, split into chunks of arbitrary size.
+
+    Returns:
+        Iterator[dict]: The elements of the array, in order.
+    """
+    decoder = json.JSONDecoder()
+    utf8_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    position = 0
+    array_started = False
+
+    for chunk in chunks:
+        buffer = buffer[position:] + utf8_decoder.decode(chunk)
+        position = 0
+        while True:
+            # skip whitespace, the opening bracket and separators between elements
+            while position < len(buffer) and buffer[position] in " \t\r\n,[":
+                if buffer[position] == "[":
+                    if array_started:
+                        break
+                    array_started = True
+                position += 1
+            if position >= len(buffer) or buffer[position] == "]":
+                break
+            try:
+                record, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # element continues in the next chunk
+                break
+            yield record
+
+    # anything left over must be the end of the array
+    buffer = buffer[position:] + utf8_decoder.decode(b"", final=True)
+    if buffer.strip() not in ("]", ""):
+        raise ValueError(f"unexpected end of JSON data: {buffer[:100]!r}")
+
+
+def _iter_record_batches(
+        records: Iterable[dict],
+        batch_size: int
+) -> Iterator[pd.DataFrame]:
+    """
+    Helper function that projects records onto the needed columns and collects them in compact DataFrames.
+
+    Args:
+        records (Iterable[dict]): Records of the EU DataLake dump.
+        batch_size (int): Maximum number of records per DataFrame.
+
+    Returns:
+        Iterator[pd.DataFrame]: DataFrames with the columns in `_EU_COLUMNS`, string columns are categorical.
+    """
+    columns = {column: [] for column in _EU_COLUMNS}
+    for record in records:
+        for column, values in columns.items():
+            values.append(record.get(column))
+        if len(columns["product_code"]) >= batch_size:
+            yield _to_compact_frame(columns)
+            columns = {column: [] for column in _EU_COLUMNS}
+    if len(columns["product_code"]) > 0:
+        yield _to_compact_frame(columns)
+
+
+def _to_compact_frame(
+        columns: dict[str, list]
+) -> pd.DataFrame:
+    """
+    Helper function that turns collected column values into a DataFrame with categorical string columns.
+
+    Args:
+        columns (dict[str, list]): Values per column.
+
+    Returns:
+        pd.DataFrame: DataFrame with the given columns.
+    """
+    return pd.DataFrame({
+        column: pd.Categorical(values) if column in _EU_CATEGORICAL_COLUMNS else pd.Series(values)
+        for column, values in columns.items()
+    })
+
+
+def _concat_batches(
+        batches: Iterable[pd.DataFrame]
+) -> pd.DataFrame:
+    """
+    Helper function that concatenates compact batches while keeping categorical columns categorical.
+
+    Each batch is folded in as it arrives: its categorical columns are translated to codes of categories shared 
+    by all batches and only those codes are kept, so at most one batch is held in full at any time.
+    Categories are sorted, so sorting a categorical column gives the same order as sorting its strings.
+
+    Args:
+        batches (Iterable[pd.DataFrame]): DataFrames created by `_iter_record_batches()`.
+
+    Returns:
+        pd.DataFrame: All batches in a single DataFrame with a fresh index.
+    """
+    # categories in the order they were first seen and the codes of all batches so far, per categorical column
+    categories = {column: {} for column in _EU_CATEGORICAL_COLUMNS}
+    codes = {column: [] for column in _EU_CATEGORICAL_COLUMNS}
+    values = {column: [] for column in _EU_COLUMNS if column not in _EU_CATEGORICAL_COLUMNS}
+    for batch in batches:
+        for column, column_categories in categories.items():
+            batch_column = batch[column].cat
+            batch_codes = np.array(
+                [column_categories.setdefault(category, len(column_categories)) for category in batch_column.categories] + [-1],
+                dtype=np.int32
+            )
+            # missing values have code -1, which picks the -1 appended above
+            codes[column].append(batch_codes[batch_column.codes])
+        for column, column_values in values.items():
+            column_values.append(batch[column].to_numpy())
+
+    if len(codes["product_code"]) == 0:
+        return pd.DataFrame(columns=_EU_COLUMNS)
 
-    response = requests.get(f"https://api.datalake.sante.service.ec.europa.eu/sante/pesticides/pesticide_residues_mrls/download?format={format}&language={language}&api-version=v2.0", headers=headers)
-    data = response.json()
-    return _eu_clean_data(data)
+    data = {}
+    for column in _EU_COLUMNS:
+        if column in _EU_CATEGORICAL_COLUMNS:
+            # sort the categories and translate the codes accordingly
+            unsorted_categories = list(categories[column])
+            order = np.argsort(np.array(unsorted_categories, dtype=object), kind="stable")
+            sorted_codes = np.empty(len(order) + 1, dtype=np.int32)
+            sorted_codes[order] = np.arange(len(order), dtype=np.int32)
+            sorted_codes[-1] = -1
+            data[column] = pd.Categorical.from_codes(
+                sorted_codes[np.concatenate(codes[column])],
+                categories=[unsorted_categories[i] for i in order]
+            )
+        else:
+            data[column] = pd.Series(np.concatenate(values[column]))
+    return pd.DataFrame(data)
 
 
 def _eu_clean_data(
-        data: json
+        data: pd.DataFrame
 ) -> tuple[pd.DataFrame, pd.DataFrame]:
     """
-    Cleans the JSON data fetched by `eu_fetch_api`.
+    Cleans the data fetched by `eu_fetch_api`.
 
     Removes unnecessary columns, splits the data into "applicable" and "not yet applicable" groups, 
     and sorts each group by pesticide name and then by product code.
@@ -52,7 +244,7 @@ def _eu_clean_data(
     """
     df = pd.DataFrame(data)
     # only get columns of importance
-    filtered_df = df[["pesticide_residue_name", "product_code", "product_name", "mrl_value_only", "applicability_text", "application_date"]]
+    filtered_df = df[_EU_COLUMNS]
     # remove duplicates
     filtered_df = filtered_df.drop_duplicates()
     # remove non-applicable values
@@ -85,51 +277,138 @@ def get_fitting_pesticides(
         prompts = yaml.safe_load(f)
     compare_pesticides_prompt = prompts["compare_pesticides_prompt"]
 
-    openai_client = openai.OpenAI(
-        base_url=settings.kipitz_base_url,
-        api_key=settings.kipitz_api_token
-    )
-
     # get unique pesticides from chinese data
     chi_pesticides = pesticide_df["pesticide"].unique().tolist()
 
-    # get all pesticides from eu database
-    raw_data = get_all_pesticides()
-    all_eu_pesticides = [row[0].strip() for row in raw_data]
+    # get all pesticides from eu database, names are already stripped and tokenized
+    eu_reference_index = get_eu_reference_index()
 
     ## to pre-filter out possible matches so we don't send too much to the LLM later on
     #TODO: could be bad practice, if there are entirely different names for pesticides! -> do domain research
     threshold = 50
     # common english words in the dataset we don't want in our match
     stop_words = {"and", "its", "as", "of", "sum", "expressed", "including", "other"}
+    rough_fuzzy_matches_dict = _get_fuzzy_candidates(
+        chi_pesticides,
+        eu_reference_index.names,
+        eu_reference_index.name_tokens,
+        threshold,
+        stop_words
+    )
 
     possible_matches_dict = {}
     # do exact search with the leftover pesticide list using an LLM
     for chi_pest in chi_pesticides:
-        # pre filter
-        rough_fuzzy_matches = [
-            (eu_pest)
-            for chi_word in chi_pest.split()
-            for eu_pest in all_eu_pesticides
-            for eu_word in eu_pest.split()
-            if eu_word.lower() not in stop_words
-            and fuzz.ratio(chi_word.lower(), eu_word.lower()) >= threshold
-        ]
-        # remove duplicates
-        rough_fuzzy_matches = list(set(rough_fuzzy_matches))
+        rough_fuzzy_matches = rough_fuzzy_matches_dict[chi_pest]
         # prepare prompt
         prompt = compare_pesticides_prompt.format(
             chinese_pesticide=chi_pest,
             european_pesticides = rough_fuzzy_matches
         )
         # prompt LLM with the fuzzy matches
-        possible_matches_list = []
-        completion = openai_client.chat.completions.create(
-            model=settings.kipitz_model,
-            messages=[{"role": settings.kipitz_role, "content": prompt}],   
-        )
-        answer = completion.choices[0].message.content
-        possible_matches_list = ast.literal_eval(answer)
+        answer = cached_completion(prompt)
+        try:
+            possible_matches_list = ast.literal_eval(answer)
+        except (ValueError, SyntaxError):
+            # don't keep malformed answers in the cache
+            discard_cached_completion(prompt)
+            raise
         possible_matches_dict[chi_pest] = possible_matches_list
         
     return possible_matches_dict
+
+
+def get_pesticide_prompt_hash() -> str:
+    """
+    Returns a hash of the prompt `get_fitting_pesticides()` maps pesticides with, so stored mappings can be 
+    told apart from ones made with another prompt.
+
+    Returns:
+        str: SHA-256 hex digest of the prompt template.
+    """
+    with open(settings.prompt_path, "r", encoding="utf-8") as f:
+        prompts = yaml.safe_load(f)
+    return hashlib.sha256(prompts["compare_pesticides_prompt"].encode("utf-8")).hexdigest()
+
+
+def _build_eu_vocabulary(
+        name_tokens: list[list[str]],
+        stop_words: set[str]
+) -> tuple[list[str], list[list[int]]]:
+    """
+    Collects the words of the EU pesticide names into a vocabulary of unique words.
+
+    Args:
+        name_tokens (list[list[str]]): Lowercased words of every EU pesticide name.
+        stop_words (set[str]): Lowercased words which are left out of the vocabulary.
+
+    Returns:
+        tuple[list[str], list[list[int]]]: A tuple of
+            the vocabulary of unique words,
+            and an inverted index holding for every vocabulary word the positions of the names containing it.
+    """
+    vocabulary = []
+    token_index = []
+    token_positions = {}
+    for name_position, words in enumerate(name_tokens):
+        for word in words:
+            if word in stop_words:
+                continue
+            if word not in token_positions:
+                token_positions[word] = len(vocabulary)
+                vocabulary.append(word)
+                token_index.append([])
+            postings = token_index[token_positions[word]]
+            # a word can occur several times in the same name
+            if not postings or postings[-1] != name_position:
+                postings.append(name_position)
+    return vocabulary, token_index
+
+
+def _get_fuzzy_candidates(
+        chi_pesticides: list[str],
+        eu_pesticides: list[str],
+        eu_name_tokens: list[list[str]],
+        threshold: float,
+        stop_words: set[str]
+) -> dict:
+    """
+    Pre-filters the EU pesticides which could match each Chinese pesticide.
+
+    An EU pesticide is a candidate if any word of its name, besides the stop words, reaches the threshold in
+    `fuzz.ratio` against any word of the Chinese pesticide (both lowercased). All word pairs are scored at once 
+    as one similarity matrix, using all available cores.
+
+    Args:
+        chi_pesticides (list[str]): Names of the Chinese pesticides.
+        eu_pesticides (list[str]): Unique names of all EU pesticides.
+        eu_name_tokens (list[list[str]]): Lowercased words of every EU pesticide name.
+        threshold (float): Minimum similarity (0-100) of a word pair.
+        stop_words (set[str]): Lowercased words which are never compared.
+
+    Returns:
+        dict: Dictionary in the format {chinese_pesticide: [european_pesticide, european_pesticide...]}, 
+            candidates are in the order of `eu_pesticides`.
+    """
+    vocabulary, token_index = _build_eu_vocabulary(eu_name_tokens, stop_words)
+    chi_words = list(dict.fromkeys(word.lower() for chi_pest in chi_pesticides for word in chi_pest.split()))
+    if not chi_words or not vocabulary:
+        return {chi_pest: [] for chi_pest in chi_pesticides}
+
+    # scores below the cutoff are returned as 0
+    scores = process.cdist(
+        chi_words,
+        vocabulary,
+        scorer=fuzz.ratio,
+        score_cutoff=threshold,
+        workers=-1
+    )
+    word_rows = {word: row for row, word in enumerate(chi_words)}
+
+    candidates_dict = {}
+    for chi_pest in chi_pesticides:
+        rows = [word_rows[word.lower()] for word in chi_pest.split()]
+        matched_tokens = np.flatnonzero((scores[rows] >= threshold).any(axis=0)) if rows else []
+        name_positions = {position for token in matched_tokens for position in token_index[token]}
+        candidates_dict[chi_pest] = [eu_pesticides[position] for position in sorted(name_positions)]
+    return candidates_dict
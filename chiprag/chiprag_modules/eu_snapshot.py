@@ -0,0 +1,72 @@
+"""
+Keeps the last cleaned EU DataLake data as a local, compressed Parquet snapshot.
+
+The snapshot lets `update_eu_data()` notice unchanged DataLake releases without downloading them again and
+rebuild the database offline.
+"""
+import json
+import pandas as pd
+from pathlib import Path
+from config.load_config import settings
+
+_APPLICABLE_FILE = "applicable.parquet"
+_NOT_YET_APPLICABLE_FILE = "not_yet_applicable.parquet"
+_METADATA_FILE = "metadata.json"
+
+
+def load_snapshot_metadata() -> dict | None:
+    """
+    Loads the metadata of the download the current snapshot was created from.
+
+    Returns:
+        dict | None: Metadata as returned by `eu_fetch_api()`, None if there is no snapshot.
+    """
+    path = Path(settings.eu_snapshot_dir)
+    if not all((path / file).is_file() for file in (_APPLICABLE_FILE, _NOT_YET_APPLICABLE_FILE, _METADATA_FILE)):
+        return None
+    with open(path / _METADATA_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_snapshot() -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Loads the cleaned EU DataLake data of the current snapshot.
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: A tuple of two DataFrames, in the same format as returned by `eu_fetch_api()` —
+            the first with currently applicable values,
+            the second with values not yet applicable.
+    """
+    path = Path(settings.eu_snapshot_dir)
+    if load_snapshot_metadata() is None:
+        raise FileNotFoundError(f"no EU snapshot found in {path}, run an online update first.")
+    applicable_data = pd.read_parquet(path / _APPLICABLE_FILE)
+    not_yet_applicable_data = pd.read_parquet(path / _NOT_YET_APPLICABLE_FILE)
+    return applicable_data, not_yet_applicable_data
+
+
+def save_snapshot(
+        applicable_data: pd.DataFrame,
+        not_yet_applicable_data: pd.DataFrame,
+        metadata: dict
+) -> None:
+    """
+    Replaces the current snapshot with the given cleaned EU DataLake data.
+
+    The metadata is written last, so an interrupted save never leaves a snapshot that looks complete.
+
+    Args:
+        applicable_data (pd.DataFrame): DataFrame with applicable entries.
+        not_yet_applicable_data (pd.DataFrame): DataFrame with not yet applicable entries.
+        metadata (dict): Metadata of the download, as returned by `eu_fetch_api()`.
+
+    Returns:
+        None
+    """
+    path = Path(settings.eu_snapshot_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    (path / _METADATA_FILE).unlink(missing_ok=True)
+    applicable_data.to_parquet(path / _APPLICABLE_FILE, compression="zstd")
+    not_yet_applicable_data.to_parquet(path / _NOT_YET_APPLICABLE_FILE, compression="zstd")
+    with open(path / _METADATA_FILE, "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
@@ -0,0 +1,206 @@
+"""
+Rule-based matching of Chinese foods to EU products, used before the LLM is asked to compare the values of a pair
+of pesticides.
+
+A Chinese food is matched if exactly one EU product has the same name after normalisation (case, punctuation,
+plurals, alternatives like "Maize/corn"), or otherwise if exactly one EU product is listed as its synonym in
+`config/food_synonyms.yaml`. Chinese categories (MRL -2) are never compared. Everything else is left to the LLM.
+"""
+import math
+import re
+import threading
+import yaml
+import pandas as pd
+from decimal import Decimal
+from config.load_config import settings
+
+_food_synonyms = None
+_food_synonyms_lock = threading.Lock()
+
+
+def normalize_food_name(
+        name: str
+) -> str:
+    """
+    Normalises a food name for comparison: lowercased, punctuation removed, "&" written out and every word in
+    singular.
+
+    Args:
+        name (str): Name of a Chinese food or EU product.
+
+    Returns:
+        str: The normalised name, e.g. "cherry tomato" for "Cherry Tomatoes".
+    """
+    words = re.findall(r"[^\W_]+", name.lower().replace("&", " and "))
+    return " ".join(_singularize(word) for word in words)
+
+
+def _singularize(
+        word: str
+) -> str:
+    """
+    Helper function that strips the plural ending of an English word. Only has to turn singular and plural of
+    the same word into the same string, not into correct English.
+
+    Args:
+        word (str): Lowercased word.
+
+    Returns:
+        str: The word without plural ending.
+    """
+    if len(word) <= 3:
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("oes", "ches", "shes", "sses", "xes", "zes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def get_food_synonyms() -> dict[str, list[str]]:
+    """
+    Returns the curated synonyms of Chinese foods, loading them on first use.
+
+    Returns:
+        dict[str, list[str]]: Mapping of normalised Chinese food names to the normalised names of their EU products.
+    """
+    global _food_synonyms
+    with _food_synonyms_lock:
+        if _food_synonyms is None:
+            with open(settings.food_synonyms_path, "r", encoding="utf-8") as f:
+                synonyms = yaml.safe_load(f) or {}
+            _food_synonyms = {
+                normalize_food_name(chi_food): [normalize_food_name(eu_food) for eu_food in eu_foods]
+                for chi_food, eu_foods in synonyms.items()
+            }
+    return _food_synonyms
+
+
+def match_foods(
+        chi_pest_df: pd.DataFrame,
+        eu_pest_df: pd.DataFrame
+) -> tuple[list[tuple[int, list]], list[int]]:
+    """
+    Matches the foods of a Chinese pesticide to the products of a European pesticide without the LLM.
+
+    Args:
+        chi_pest_df (pd.DataFrame): DataFrame containing the information of a single Chinese pesticide.
+        eu_pest_df (pd.DataFrame): DataFrame containing the information of a single European pesticide.
+
+    Returns:
+        tuple[list[tuple[int, list]], list[int]]: A tuple of
+            the matched foods as (position in chi_pest_df, row) with rows in the layout the comparison prompt asks
+            the LLM for: ["chinese_food", "european_food", chinese_mrl_value, european_mrl_value, "note"],
+            and the positions of the rows of chi_pest_df which are left to the LLM.
+    """
+    synonyms = get_food_synonyms()
+
+    # normalised names and alternatives of the EU products, the first entry of a product counts
+    eu_products = {}
+    for eu_food, eu_mrl in zip(eu_pest_df["food"].tolist(), eu_pest_df["mrl"].tolist()):
+        if not isinstance(eu_food, str):
+            continue
+        names = {normalize_food_name(eu_food)} | {normalize_food_name(part) for part in eu_food.split("/")}
+        for name in names:
+            eu_products.setdefault(name, {}).setdefault(eu_food, eu_mrl)
+
+    matched_rows = []
+    leftover_positions = []
+    for position, (chi_food, chi_mrl) in enumerate(zip(chi_pest_df["food"].tolist(), chi_pest_df["mrl"].tolist())):
+        # categories aren't compared, the LLM is told the same
+        if _is_category(chi_mrl):
+            matched_rows.append((position, [chi_food, "/", chi_mrl, "/", "Category."]))
+            continue
+
+        match = _find_product(chi_food, eu_products, synonyms) if isinstance(chi_food, str) else None
+        if match is None:
+            leftover_positions.append(position)
+            continue
+        eu_food, eu_mrl = match
+        eu_mrl = _to_mrl_value(eu_mrl)
+        note = "No EU value." if eu_mrl == "/" else "No Note."
+        matched_rows.append((position, [chi_food, eu_food, chi_mrl, eu_mrl, note]))
+
+    return matched_rows, leftover_positions
+
+
+def _find_product(
+        chi_food: str,
+        eu_products: dict[str, dict],
+        synonyms: dict[str, list[str]]
+) -> tuple[str, object] | None:
+    """
+    Helper function that looks up the single EU product matching a Chinese food, first by its normalised name,
+    then by its synonyms.
+
+    Args:
+        chi_food (str): Name of the Chinese food.
+        eu_products (dict[str, dict]): Mapping of normalised EU names to the products {name: mrl} carrying them.
+        synonyms (dict[str, list[str]]): Normalised synonyms as returned by `get_food_synonyms()`.
+
+    Returns:
+        tuple[str, object] | None: Name and MRL of the EU product, None if there is none or more than one.
+    """
+    name = normalize_food_name(chi_food)
+    for candidate_names in ([name], synonyms.get(name, [])):
+        products = {}
+        for candidate_name in candidate_names:
+            products.update(eu_products.get(candidate_name, {}))
+        if len(products) == 1:
+            return next(iter(products.items()))
+        if len(products) > 1:
+            # ambiguous, the LLM has to decide
+            return None
+    return None
+
+
+def _is_category(
+        mrl: object
+) -> bool:
+    """
+    Helper function that tells whether a Chinese MRL marks a category (-2).
+
+    Args:
+        mrl (object): MRL value of a Chinese food.
+
+    Returns:
+        bool: Whether the food is a category.
+    """
+    if isinstance(mrl, bool):
+        return False
+    try:
+        return float(mrl) == -2
+    except (TypeError, ValueError):
+        return False
+
+
+def _to_mrl_value(
+        mrl: object
+) -> object:
+    """
+    Helper function that turns an EU MRL into the value the LLM would answer with: a number, or "/" if there is
+    none (EU categories have no value).
+
+    Args:
+        mrl (object): MRL as stored in the EU data.
+
+    Returns:
+        object: int or float, "/" if there is no value, the stripped text if it isn't a number.
+    """
+    if mrl is None or (isinstance(mrl, float) and math.isnan(mrl)):
+        return "/"
+    if isinstance(mrl, Decimal):
+        return float(mrl)
+    if isinstance(mrl, str):
+        text = mrl.strip()
+        if text == "":
+            return "/"
+        for number_type in (int, float):
+            try:
+                return number_type(text)
+            except ValueError:
+                pass
+        return text
+    return mrl
@@ -0,0 +1,263 @@
+"""
+Persistent, content-addressed cache for LLM answers, stored in a local SQLite database.
+
+Answers are keyed by the configured model, role and a hash of the fully formatted prompt. Every entry also
+carries a fingerprint of the model and the prompt file (`config/prompt.yaml`), so changing either of them
+automatically invalidates all previously cached answers.
+"""
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from config.load_config import settings
+from .llm_client import get_llm_client
+
+# share of `max_entries` evicted at once, so the cache is only trimmed every few thousand answers and not on every put
+_EVICTION_SHARE = 0.1
+
+
+class LLMCache:
+    """
+    SQLite-backed cache for LLM answers with TTL and size based eviction.
+
+    Args:
+        path (str): Path of the SQLite database file, created if it doesn't exist.
+        max_entries (int): Maximum number of cached answers, the least recently used ones are evicted first.
+        ttl_seconds (float): Time in seconds after which a cached answer expires.
+        fingerprint (str): Hash of everything that invalidates the cache as a whole when it changes.
+    """
+    def __init__(
+            self,
+            path: str,
+            max_entries: int,
+            ttl_seconds: float,
+            fingerprint: str
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.fingerprint = fingerprint
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_answers (
+                    key TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                )
+                """
+            )
+            # eviction picks the least recently used answers without sorting the whole table
+            self._conn.execute("CREATE INDEX IF NOT EXISTS llm_answers_last_used_at_idx ON llm_answers (last_used_at)")
+            # drop everything created with another model or prompt file, as well as expired answers
+            self._conn.execute(
+                "DELETE FROM llm_answers WHERE fingerprint != ? OR created_at < ?",
+                (self.fingerprint, time.time() - self.ttl_seconds)
+            )
+            # upper bound of the stored answers, replaced answers are counted twice until the next eviction
+            self._entries = self._conn.execute("SELECT COUNT(*) FROM llm_answers").fetchone()[0]
+            self._evict()
+
+    @staticmethod
+    def make_key(
+            model: str,
+            role: str,
+            prompt: str
+    ) -> str:
+        """
+        Builds the content-addressed key of a prompt.
+
+        Args:
+            model (str): Model which is prompted.
+            role (str): Role the prompt is sent with.
+            prompt (str): Fully formatted prompt.
+
+        Returns:
+            str: SHA-256 hex digest identifying the prompt.
+        """
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        return hashlib.sha256(f"{model}\x00{role}\x00{prompt_hash}".encode("utf-8")).hexdigest()
+
+    def get(
+            self,
+            key: str
+    ) -> str | None:
+        """
+        Looks up a cached answer and counts the lookup as hit or miss.
+
+        Args:
+            key (str): Key built with `make_key()`.
+
+        Returns:
+            str | None: The cached answer, None if there is no valid entry.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT answer FROM llm_answers WHERE key = ? AND fingerprint = ? AND created_at >= ?",
+                (key, self.fingerprint, now - self.ttl_seconds)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_answers SET last_used_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(
+            self,
+            key: str,
+            answer: str
+    ) -> None:
+        """
+        Stores an answer. Once more than `max_entries` answers are stored, the least recently used ones are 
+        evicted, leaving room for the next few thousand answers.
+
+        Args:
+            key (str): Key built with `make_key()`.
+            answer (str): Answer of the LLM.
+
+        Returns:
+            None
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_answers (key, fingerprint, answer, created_at, last_used_at) VALUES (?, ?, ?, ?, ?)",
+                (key, self.fingerprint, answer, now, now)
+            )
+            self._entries += 1
+            if self._entries > self.max_entries:
+                self._evict()
+
+    def _evict(self) -> None:
+        """
+        Helper method that evicts the least recently used answers if more than `max_entries` are stored, down to 
+        `max_entries` minus the share given by `_EVICTION_SHARE`. Has to be called holding the lock.
+
+        Returns:
+            None
+        """
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM llm_answers").fetchone()[0]
+        if self._entries <= self.max_entries:
+            return
+        keep = self.max_entries - int(self.max_entries * _EVICTION_SHARE)
+        self._conn.execute(
+            """
+            DELETE FROM llm_answers WHERE key IN (
+                SELECT key FROM llm_answers ORDER BY last_used_at ASC LIMIT ?
+            )
+            """,
+            (self._entries - keep,)
+        )
+        self._entries = keep
+
+    def discard(
+            self,
+            key: str
+    ) -> None:
+        """
+        Removes a single answer, e.g. because it turned out to be malformed.
+
+        Args:
+            key (str): Key built with `make_key()`.
+
+        Returns:
+            None
+        """
+        with self._lock, self._conn:
+            self._entries -= self._conn.execute("DELETE FROM llm_answers WHERE key = ?", (key,)).rowcount
+
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache:
+    """
+    Returns the process-wide LLM cache, creating it on first use.
+
+    Returns:
+        LLMCache: Cache configured through the settings.
+    """
+    global _llm_cache
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            with open(settings.prompt_path, "rb") as f:
+                prompt_file_hash = hashlib.sha256(f.read()).hexdigest()
+            fingerprint = hashlib.sha256(f"{settings.kipitz_model}\x00{prompt_file_hash}".encode("utf-8")).hexdigest()
+            _llm_cache = LLMCache(
+                path=settings.llm_cache_path,
+                max_entries=settings.llm_cache_max_entries,
+                ttl_seconds=settings.llm_cache_ttl_days * 24 * 60 * 60,
+                fingerprint=fingerprint
+            )
+    return _llm_cache
+
+
+def cached_completion(
+        prompt: str
+) -> str:
+    """
+    Prompts the LLM through the shared LLM client unless an answer to the exact same prompt is already cached.
+
+    Args:
+        prompt (str): Fully formatted prompt.
+
+    Returns:
+        str: Answer of the LLM.
+    """
+    llm_client = get_llm_client()
+    if not settings.llm_cache_enabled:
+        return llm_client.complete(settings.kipitz_model, settings.kipitz_role, prompt)
+
+    llm_cache = get_llm_cache()
+    key = llm_cache.make_key(settings.kipitz_model, settings.kipitz_role, prompt)
+    answer = llm_cache.get(key)
+    if answer is not None:
+        return answer
+
+    answer = llm_client.complete(settings.kipitz_model, settings.kipitz_role, prompt)
+    llm_cache.put(key, answer)
+
+    return answer
+
+
+def discard_cached_completion(
+        prompt: str
+) -> None:
+    """
+    Removes the cached answer of a prompt, so the LLM is asked again next time.
+
+    Args:
+        prompt (str): Fully formatted prompt.
+
+    Returns:
+        None
+    """
+    if not settings.llm_cache_enabled:
+        return
+    llm_cache = get_llm_cache()
+    llm_cache.discard(llm_cache.make_key(settings.kipitz_model, settings.kipitz_role, prompt))
+
+
+def log_cache_stats() -> None:
+    """
+    Logs the hit and miss counters of the LLM cache.
+
+    Returns:
+        None
+    """
+    if not settings.llm_cache_enabled or _llm_cache is None:
+        return
+    logging.info(f"LLM cache: {_llm_cache.hits} hits, {_llm_cache.misses} misses.")
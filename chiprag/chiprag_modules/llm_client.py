@@ -0,0 +1,345 @@
+"""
+Shared client for the OpenAI-compatible LLM API.
+
+All requests of the process go through a single client which
+- keeps to the configured requests and tokens per minute with token buckets,
+- retries rate limited (429), timed out and failed (5xx) requests with jittered exponential backoff,
+- adapts the number of concurrent requests, halving it when the API throttles and slowly growing it again
+  while requests succeed, up to `LLM_MAX_WORKERS`.
+"""
+import logging
+import math
+import openai
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config.load_config import settings
+
+# status codes worth another try, besides timeouts and connection errors
+_RETRY_STATUS_CODES = {408, 409, 429}
+
+
+class TokenBucket:
+    """
+    Token bucket limiting how much of something (requests, tokens) may be used per minute. The bucket holds at
+    most one minute worth of tokens and refills continuously.
+
+    Args:
+        per_minute (int): Tokens available per minute, 0 for no limit.
+    """
+    def __init__(
+            self,
+            per_minute: int
+    ) -> None:
+        self.capacity = per_minute
+        self.tokens = float(per_minute)
+        self._refilled_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        """
+        Helper function that adds the tokens accumulated since the last refill. Must be called with the lock held.
+
+        Returns:
+            None
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._refilled_at) * self.capacity / 60)
+        self._refilled_at = now
+
+    def acquire(
+            self,
+            amount: float
+    ) -> None:
+        """
+        Takes tokens from the bucket, waiting until enough are available. More tokens than the bucket can hold
+        are taken once it's full.
+
+        Args:
+            amount (float): Number of tokens to take.
+
+        Returns:
+            None
+        """
+        if self.capacity == 0:
+            return
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) * 60 / self.capacity
+            time.sleep(wait)
+
+    def consume(
+            self,
+            amount: float
+    ) -> None:
+        """
+        Takes tokens without waiting, e.g. to correct an estimate once the actual usage is known. The bucket may
+        go into debt, which later `acquire()` calls wait off.
+
+        Args:
+            amount (float): Number of tokens to take, negative to give tokens back.
+
+        Returns:
+            None
+        """
+        if self.capacity == 0:
+            return
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class AdaptiveConcurrency:
+    """
+    Limits the number of concurrent requests with additive increase, multiplicative decrease: a throttled request
+    halves the limit, every successful one raises it by 1/limit, i.e. by one per limit successful requests.
+
+    Args:
+        max_limit (int): Upper bound of the limit, which is also the starting limit.
+    """
+    def __init__(
+            self,
+            max_limit: int
+    ) -> None:
+        self.max_limit = max_limit
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        """
+        Waits until another request may be sent.
+
+        Returns:
+            None
+        """
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(
+            self,
+            throttled: bool
+    ) -> None:
+        """
+        Marks a request as done and adapts the limit.
+
+        Args:
+            throttled (bool): Whether the API rate limited the request.
+
+        Returns:
+            None
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class LLMClient:
+    """
+    Rate limited, retrying and adaptively concurrent client for chat completions.
+
+    Args:
+        openai_client (openai.OpenAI): Client the requests are sent with, its own retries should be disabled.
+        requests_per_minute (int): Maximum number of requests per minute, 0 for no limit.
+        tokens_per_minute (int): Maximum number of tokens per minute, 0 for no limit.
+        max_concurrency (int): Maximum number of concurrent requests.
+        max_retries (int): Number of times a request is retried before its error is raised.
+        backoff_base (float): Delay in seconds before the first retry, doubled for every further one.
+        backoff_max (float): Upper bound of the delay in seconds.
+    """
+    def __init__(
+            self,
+            openai_client: openai.OpenAI,
+            requests_per_minute: int,
+            tokens_per_minute: int,
+            max_concurrency: int,
+            max_retries: int,
+            backoff_base: float,
+            backoff_max: float
+    ) -> None:
+        self.openai_client = openai_client
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def complete(
+            self,
+            model: str,
+            role: str,
+            prompt: str
+    ) -> str:
+        """
+        Sends a single message and returns the answer, retrying transient failures.
+
+        Args:
+            model (str): Model which is prompted.
+            role (str): Role the prompt is sent with.
+            prompt (str): Fully formatted prompt.
+
+        Returns:
+            str: Answer of the LLM.
+        """
+        # roughly four characters per token, corrected with the reported usage afterwards
+        estimated_tokens = math.ceil(len(prompt) / 4)
+        attempt = 0
+        while True:
+            self.request_bucket.acquire(1)
+            self.token_bucket.acquire(estimated_tokens)
+            self.concurrency.acquire()
+            throttled = False
+            try:
+                with self._lock:
+                    self.requests += 1
+                completion = self.openai_client.chat.completions.create(
+                    model=model,
+                    messages=[{"role": role, "content": prompt}],
+                )
+            except (openai.APIConnectionError, openai.APIStatusError) as e:
+                throttled = isinstance(e, openai.RateLimitError)
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                delay = self._get_delay(attempt, e)
+                with self._lock:
+                    self.retries += 1
+                    self.throttled += throttled
+                logging.warning(f"LLM request failed ({type(e).__name__}), retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries}).")
+            else:
+                if completion.usage is not None:
+                    self.token_bucket.consume(completion.usage.total_tokens - estimated_tokens)
+                return completion.choices[0].message.content
+            finally:
+                self.concurrency.release(throttled)
+            time.sleep(delay)
+            attempt += 1
+
+    def _get_delay(
+            self,
+            attempt: int,
+            error: Exception
+    ) -> float:
+        """
+        Helper function that returns how long to wait before retrying a failed request: a random delay of up to
+        `backoff_base * 2 ** attempt` seconds ("full jitter"), at least as long as the API asked for with a
+        Retry-After header.
+
+        Args:
+            attempt (int): Number of retries of the request so far.
+            error (Exception): Error of the failed request.
+
+        Returns:
+            float: Delay in seconds.
+        """
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        response = getattr(error, "response", None)
+        if response is not None:
+            try:
+                delay = max(delay, min(self.backoff_max, float(response.headers.get("retry-after", 0))))
+            except ValueError:
+                # Retry-After may also be an HTTP date, the backoff is used then
+                pass
+        return delay
+
+
+def _is_retryable(
+        error: Exception
+) -> bool:
+    """
+    Helper function that tells transient errors, which are worth another try, from permanent ones.
+
+    Args:
+        error (Exception): Error raised by the OpenAI client.
+
+    Returns:
+        bool: Whether the request should be retried.
+    """
+    if isinstance(error, openai.APIConnectionError):
+        # includes timeouts
+        return True
+    return error.status_code in _RETRY_STATUS_CODES or error.status_code >= 500
+
+
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """
+    Returns the process-wide LLM client, creating it on first use.
+
+    Returns:
+        LLMClient: Client configured through the settings.
+    """
+    global _llm_client
+    with _llm_client_lock:
+        if _llm_client is None:
+            openai_client = openai.OpenAI(
+                base_url=settings.kipitz_base_url,
+                api_key=settings.kipitz_api_token,
+                timeout=settings.llm_timeout_seconds,
+                # retries are handled by `LLMClient`, so they count towards its limits
+                max_retries=0
+            )
+            _llm_client = LLMClient(
+                openai_client=openai_client,
+                requests_per_minute=settings.llm_requests_per_minute,
+                tokens_per_minute=settings.llm_tokens_per_minute,
+                max_concurrency=settings.llm_max_workers,
+                max_retries=settings.llm_max_retries,
+                backoff_base=settings.llm_backoff_base_seconds,
+                backoff_max=settings.llm_backoff_max_seconds
+            )
+    return _llm_client
+
+
+_llm_executor = None
+_llm_executor_lock = threading.Lock()
+
+
+def get_llm_executor() -> ThreadPoolExecutor:
+    """
+    Returns the process-wide thread pool LLM requests are fanned out on, creating it on first use. Callers running 
+    at the same time, e.g. the steps of a pipelined comparison, share its `LLM_MAX_WORKERS` threads instead of 
+    opening a pool each. Tasks on the pool must not wait for other tasks on it.
+
+    Returns:
+        ThreadPoolExecutor: The shared thread pool.
+    """
+    global _llm_executor
+    with _llm_executor_lock:
+        if _llm_executor is None:
+            _llm_executor = ThreadPoolExecutor(max_workers=settings.llm_max_workers, thread_name_prefix="llm")
+    return _llm_executor
+
+
+def log_client_stats() -> None:
+    """
+    Logs the request, retry and throttling counters of the LLM client.
+
+    Returns:
+        None
+    """
+    if _llm_client is None:
+        return
+    logging.info(
+        f"LLM client: {_llm_client.requests} requests, {_llm_client.retries} retries, "
+        f"{_llm_client.throttled} rate limited, concurrency limit {int(_llm_client.concurrency.limit)}."
+    )
@@ -6,37 +6,156 @@ for Pesticides in Foods," published by the United States Department of Agricultu
 the translation of document `GB 2763-2021`, but it should work similarly for related reports of the same kind.
 """
 import logging
+import pandas as pd
 import pymupdf 
 import re
+from collections.abc import Callable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
 
 
+class PDFSession:
+    """
+    PDF document opened once and shared by the loader functions, so a document is only read and parsed once 
+    no matter how many page ranges are loaded from it. The file is read into memory and pages are accessed 
+    by index, the document itself is never modified.
+
+    Args:
+        pdf_path (str): System path to the PDF document.
+    """
+    def __init__(
+            self,
+            pdf_path: str
+    ) -> None:
+        ## faulty argument handling
+        path = Path(pdf_path)
+        if not path.exists():
+            raise FileNotFoundError(f"file not found: {pdf_path}")
+        if not path.is_file() or path.suffix.lower() != ".pdf":
+            raise ValueError(f"provided path must be a valid pdf path: {pdf_path}")
+
+        self.path = str(path)
+        with open(path, "rb") as f:
+            self.doc = pymupdf.open(stream=f.read(), filetype="pdf")
+
+    def __enter__(self) -> "PDFSession":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Closes the document.
+
+        Returns:
+            None
+        """
+        self.doc.close()
+
+    def page_indices(
+            self,
+            start_page: int,
+            end_page: int
+    ) -> range:
+        """
+        Turns an inclusive range of page numbers into the indices of its pages, limited to the pages of the document.
+
+        Args:
+            start_page (int): First page. Inclusive using page numbers (The numbers in the PDF-Viewer).
+            end_page (int): Last page. Inclusive using page numbers (The numbers in the PDF-Viewer).
+
+        Returns:
+            range: Indices of the pages.
+        """
+        last_page = self.doc.page_count
+        if start_page > last_page:
+            raise ValueError(f"start page ({start_page}) is outside of the document (max page {last_page}).")
+        if end_page > last_page:
+            logging.warning(f"end page ({end_page}) is outside of the document (max page {last_page}), loading until the last page.")
+            end_page = last_page
+        return range(start_page - 1, end_page)
+
+    def pages(
+            self,
+            page_indices: range
+    ) -> Iterator[pymupdf.Page]:
+        """
+        Iterates over the pages with the given indices.
+
+        Args:
+            page_indices (range): Indices as returned by `page_indices()`.
+
+        Returns:
+            Iterator[pymupdf.Page]: The pages, in order.
+        """
+        return (self.doc[idx] for idx in page_indices)
+
+
+def _get_session(
+        pdf: "str | PDFSession"
+) -> PDFSession:
+    """
+    Helper function that opens a document unless it's already open.
+
+    Args:
+        pdf (str | PDFSession): System path to the PDF document or an open session.
+
+    Returns:
+        PDFSession: Session of the document.
+    """
+    return pdf if isinstance(pdf, PDFSession) else PDFSession(pdf)
+
+
 def load_pesticide_chapters(
-        pdf_path: str,    
+        pdf_path: str | PDFSession,
         start_page: int,
-        end_page: int 
+        end_page: int,
+        workers: int = 1
 ) -> str:
     """
     Extracts all the text from the specified PDF in range of the specified pages. 
     Expects the content of the pages to be the document mentioned above.
 
     Args:
-        pdf_path (str): System path to the PDF document.
+        pdf_path (str | PDFSession): System path to the PDF document or an open `PDFSession`.
         start_page (int): First page to load. Inclusive using page numbers (The numbers in the PDF-Viewer). 
                         Typically the first page containing pesticide data.
         end_page (int): Last page to load. Inclusive using page numbers (The numbers in the PDF-Viewer).
                         Usually the last page with a relevant table, excluding 
                         those about "Extraneous Maximum Residue Values."
+        workers (int): Number of processes extracting pages in parallel, 1 extracts them in this process. 
+                       The text is the same either way. Defaults to 1.
 
     Returns:
         str: A String containing the text content of the document.
     """
+    return "".join(iter_pesticide_chapter_pages(pdf_path, start_page, end_page, workers))
+
+
+def iter_pesticide_chapter_pages(
+        pdf_path: str | PDFSession,
+        start_page: int,
+        end_page: int,
+        workers: int = 1
+) -> Iterator[str]:
+    """
+    Streaming variant of `load_pesticide_chapters()`, yields the cleaned text of the specified pages one page 
+    at a time. Joined together, the pages are exactly the text `load_pesticide_chapters()` returns.
+
+    Args:
+        pdf_path (str | PDFSession): System path to the PDF document or an open `PDFSession`.
+        start_page (int): First page to load. Inclusive using page numbers (The numbers in the PDF-Viewer). 
+        end_page (int): Last page to load. Inclusive using page numbers (The numbers in the PDF-Viewer).
+        workers (int): Number of processes extracting pages in parallel, 1 extracts them in this process. 
+                       Defaults to 1.
+
+    Returns:
+        Iterator[str]: Text content of each page, in order.
+    """
     ## faulty argument handling
-    path = Path(pdf_path)
-    if not path.exists():
-        raise FileNotFoundError(f"file not found: {pdf_path}")
-    if not path.is_file() or path.suffix.lower() != ".pdf":
-        raise ValueError(f"provided path must be a valid pdf path: {pdf_path}")
+    session = _get_session(pdf_path)
     for name, value in {"start_page": start_page, "end_page": end_page}.items():
         if not isinstance(value, int):
             raise TypeError(f"{name} must be an integer, got {type(value).__name__}")
@@ -46,68 +165,40 @@ def load_pesticide_chapters(
         raise ValueError(f"`end_page` ({end_page}) must be greater than or equal to `start_page` ({start_page}).")
     if start_page == 0:
         raise ValueError("use pdf-page numbers instead of indices, first page is 1.")
+    _check_workers(workers)
     
-    ## load document and delete unwanted pages
-    doc = pymupdf.open(pdf_path)
-    last_page = doc.page_count
-    # turn page number to index
-    start_page -= 1
-    if end_page < last_page:
-        # "from=page" is inclusive, ie it starts AT that index removing pages including this very index
-        # if we want page 3 (which is idx=2) it can delete everything starting at index 3 (which would be page=4)
-        doc.delete_pages(from_page=end_page)
-    elif end_page == last_page:
-        pass
-    else:
-        logging.warning(f"end_page ({end_page}) is outside of the document (max page {last_page}), no pages deleted.")
-    if start_page > 0:
-        doc.delete_pages(from_page=0, to_page=start_page-1)
-
     ## extract text
-    text = ""
-    for page in doc:
-        """
-        TODO: adapt the cropbox to the current document(s)
-        cropbox is set to cut out the page number at the bottom, this is based on the translation of `GB 2763-2021` by the USDA.
-
-        For more information have a look at the documentation: https://pymupdf.readthedocs.io/en/latest/page.html#Page.set_cropbox
-        """
-        cropbox_width = 600  # x1
-        cropbox_height = 750  # y1
-        page.set_cropbox(pymupdf.Rect(0, 0, cropbox_width, cropbox_height))  # Rect = x0, y0, x1, y1
-        tmp_text = page.get_text(sort=True)
-        # remove multiple spaces and characters after newlines
-        text += re.sub(r'\n +', '\n', re.sub(r' {2,}', ' ', tmp_text) + '\n')
-    
-    return text
+    page_indices = session.page_indices(start_page, end_page)
+    if workers > 1:
+        return _iter_page_texts_parallel(session.path, page_indices, workers, clean=True)
+    return (_clean_page_text(_get_page_text(page)) for page in session.pages(page_indices))
 
 
 def load_pesticide_names_from_outline(
-        pdf_path: str,
+        pdf_path: str | PDFSession,
         start_outline: int,
         end_outline: int, 
-        pesticide_chapter_number: int = 4
+        pesticide_chapter_number: int = 4,
+        workers: int = 1
 ) -> list[str]:
     """
     Extracts all the pesticide names out of the outline.
     Expects the content of the pages to be the document mentioned above.
 
     Args:
-        pdf_path (str): System path to the PDF document.
+        pdf_path (str | PDFSession): System path to the PDF document or an open `PDFSession`.
         start_outline (int): First page to load. Inclusive using page numbers (The numbers in the PDF-Viewer).  
                              This is the first page containing the outline listing all pesticides mentioned in the document.
         end_page (int): Last page to load (inclusive). Inclusive using page numbers (The numbers in the PDF-Viewer).
                         This is the last page containing the outline listing all pesticides mentioned in the document.
+        workers (int): Number of processes extracting pages in parallel, 1 extracts them in this process. 
+                       Defaults to 1.
 
     Returns: 
         list[str]: List of all pesticide names listed on the specified outline pages.
     """
     ## faulty argument handling
-    path = Path(pdf_path)
-    if not path.exists():
-        raise FileNotFoundError(f"File not found: {pdf_path}")
-    if not path.is_file() or path.suffix.lower() != ".pdf":
-        raise ValueError(f"Provided path must be a valid pdf path: {pdf_path}")
+    session = _get_session(pdf_path)
     for name, value in {"start_outline": start_outline, "end_outline": end_outline, "pesticide_chapter_number": pesticide_chapter_number}.items():
         if not isinstance(value, int):
             raise TypeError(f"{name} must be an integer, got {type(value).__name__}")
@@ -117,33 +208,14 @@ def load_pesticide_names_from_outline(
         raise ValueError(f"`end_outline`({end_outline}) must be greater than `start_outline` ({start_outline}).")
     if start_outline == 0:
         raise ValueError("use pdf-page numbers instead of indices, first page is 1.")
+    _check_workers(workers)
     
-    ## load document and delete unwanted pages
-    doc = pymupdf.open(pdf_path)
-    last_page = doc.page_count
-    # turn page number to index
-    start_outline -= 1
-    if end_outline < last_page:
-        doc.delete_pages(from_page=end_outline)
-    elif end_outline == last_page:
-        pass
-    else:
-        logging.warning(f"end_outline ({end_outline}) is outside of the document (max page {last_page}), no pages deleted.")
-    if start_outline > 0:
-        doc.delete_pages(from_page=0, to_page=start_outline-1) 
     ## extract text
-    text = ""
-    for page in doc:
-        """
-        TODO: adapt the cropbox to the current document(s)
-        cropbox is set to cut out the page number at the bottom, this is based on the translation of `GB 2763-2021` by the USDA.
-
-        for more information have a look at the documentation: https://pymupdf.readthedocs.io/en/latest/page.html#Page.set_cropbox
-        """
-        cropbox_width = 600  # x1
-        cropbox_height = 750  # y1
-        page.set_cropbox(pymupdf.Rect(0, 0, cropbox_width, cropbox_height))
-        text += page.get_text(sort=True)
+    page_indices = session.page_indices(start_outline, end_outline)
+    if workers > 1:
+        text = "".join(_iter_page_texts_parallel(session.path, page_indices, workers, clean=False))
+    else:
+        text = "".join(_get_page_text(page) for page in session.pages(page_indices))
 
     ## filter out pesticide names
     """
@@ -155,3 +227,460 @@ def load_pesticide_names_from_outline(
     pesticide_list = regex.findall(text)
 
     return pesticide_list
+
+
+def load_pesticide_toc(
+        pdf_path: str | PDFSession,
+        pesticide_chapter_number: int = 4
+) -> tuple[list[str], int, int] | None:
+    """
+    Reads the pesticide chapters out of the embedded table of contents (the bookmarks) of the PDF, together 
+    with the pages they span. Unlike `load_pesticide_names_from_outline()`, no page has to be read for that 
+    and no page numbers have to be known.
+
+    The chapters start on the page the first pesticide bookmark points to. They end before the section 
+    following the last pesticide, on the page it starts on if there is text above its heading, or with the 
+    last page of the document if no section follows.
+
+    Args:
+        pdf_path (str | PDFSession): System path to the PDF document or an open `PDFSession`.
+        pesticide_chapter_number (int): Chapter number with which pesticide sections begin. For example 4 for "4.15 Zo".
+
+    Returns:
+        tuple[list[str], int, int] | None: The headings of all pesticide chapters, the first and the last page 
+            holding them (page numbers, as in the PDF-Viewer). None if the document has no bookmarks pointing 
+            to pesticide chapters.
+    """
+    ## faulty argument handling
+    session = _get_session(pdf_path)
+    if not isinstance(pesticide_chapter_number, int):
+        raise TypeError(f"pesticide_chapter_number must be an integer, got {type(pesticide_chapter_number).__name__}")
+    if pesticide_chapter_number < 0:
+        raise ValueError(f"pesticide_chapter_number must be a non-negative integer, got {pesticide_chapter_number}")
+
+    ## find pesticide chapters
+    # entries in the format [level, title, page number (-1 without destination), destination]
+    toc = session.doc.get_toc(simple=False)
+    """
+    TODO: adapt regex to the layout of the current document(s)
+    regex is currently set to the section numbers of the translation of `GB 2763-2021` by the USDA, which 
+    look like this: 4.1, 4.10, 4.100 ...
+    """
+    regex = re.compile(rf'{pesticide_chapter_number}\.\d+\s')
+    pesticide_idx = [idx for idx, entry in enumerate(toc) if regex.match(entry[1].strip())]
+    if not pesticide_idx or any(toc[idx][2] < 1 for idx in pesticide_idx):
+        return None
+    pesticide_list = [toc[idx][1].strip() for idx in pesticide_idx]
+    start_page = min(toc[idx][2] for idx in pesticide_idx)
+    last_chapter_page = max(toc[idx][2] for idx in pesticide_idx)
+
+    ## find end of last chapter
+    end_page = session.doc.page_count
+    last_level = toc[pesticide_idx[-1]][0]
+    for level, _, page_number, destination in toc[pesticide_idx[-1] + 1:]:
+        # the next section on the same or a higher level ends the pesticide chapters
+        if level > last_level or page_number < 1:
+            continue
+        end_page = page_number if _has_text_above(session.doc[page_number - 1], destination) else page_number - 1
+        break
+
+    return pesticide_list, start_page, max(end_page, last_chapter_page)
+
+
+def _has_text_above(
+        page: pymupdf.Page,
+        destination: dict
+) -> bool:
+    """
+    Helper function that checks whether there is text on a page above the target of a bookmark.
+
+    Args:
+        page (pymupdf.Page): Page the bookmark points to.
+        destination (dict): Destination of the bookmark, as returned by `pymupdf.Document.get_toc(simple=False)`.
+
+    Returns:
+        bool: Whether there is text above the target, True if the bookmark doesn't point to a position.
+    """
+    target = destination.get("to") if isinstance(destination, dict) else None
+    if target is None:
+        return True
+    return len(page.get_text("words", clip=pymupdf.Rect(0, 0, page.rect.width, target.y))) > 0
+
+
+def _get_page_text(
+        page: pymupdf.Page
+) -> str:
+    """
+    Helper function that extracts the text of a page in reading order.
+
+    Args:
+        page (pymupdf.Page): Page to extract.
+
+    Returns:
+        str: Text content of the page.
+    """
+    """
+    TODO: adapt the cropbox to the current document(s)
+    cropbox is set to cut out the page number at the bottom, this is based on the translation of `GB 2763-2021` by the USDA.
+
+    For more information have a look at the documentation: https://pymupdf.readthedocs.io/en/latest/page.html#Page.set_cropbox
+    """
+    cropbox_width = 600  # x1
+    cropbox_height = 750  # y1
+    # the document may be shared, so the original cropbox is restored for everyone else reading the page
+    original_cropbox = page.cropbox
+    page.set_cropbox(pymupdf.Rect(0, 0, cropbox_width, cropbox_height))  # Rect = x0, y0, x1, y1
+    text = page.get_text(sort=True)
+    page.set_cropbox(original_cropbox)
+    return text
+
+
+def _clean_page_text(
+        text: str
+) -> str:
+    """
+    Helper function that removes multiple spaces and spaces after newlines from the text of a chapter page.
+
+    Args:
+        text (str): Text as returned by `_get_page_text()`.
+
+    Returns:
+        str: Cleaned text, ending with a newline.
+    """
+    return re.sub(r'\n +', '\n', re.sub(r' {2,}', ' ', text) + '\n')
+
+
+def _check_workers(
+        workers: int
+) -> None:
+    """
+    Helper function that validates the number of worker processes.
+
+    Args:
+        workers (int): Number of worker processes.
+
+    Returns:
+        None
+    """
+    if not isinstance(workers, int):
+        raise TypeError(f"workers must be an integer, got {type(workers).__name__}")
+    if workers < 1:
+        raise ValueError(f"workers must be at least 1, got {workers}")
+
+
+def _iter_page_texts_parallel(
+        pdf_path: str,
+        page_indices: range,
+        workers: int,
+        clean: bool
+) -> Iterator[str]:
+    """
+    Helper function that extracts a range of pages with a pool of worker processes, each opening the document 
+    itself. The pages are passed on in order, so the text is exactly the text extracted by a single process.
+
+    Args:
+        pdf_path (str): System path to the PDF document.
+        page_indices (range): Indices of the pages to extract.
+        workers (int): Number of worker processes.
+        clean (bool): Whether to clean the text with `_clean_page_text()`.
+
+    Returns:
+        Iterator[str]: Text content of each page, in order.
+    """
+    return _iter_pages_parallel(pdf_path, page_indices, workers, _extract_page_texts, clean)
+
+
+def _iter_pages_parallel(
+        pdf_path: str,
+        page_indices: range,
+        workers: int,
+        extract_batch: Callable[..., list],
+        *args
+) -> Iterator:
+    """
+    Helper function that processes a range of pages with a pool of worker processes, each opening the document 
+    itself. The range is split into consecutive batches whose results are passed on in order, so the results 
+    are exactly the ones of a single process.
+
+    Args:
+        pdf_path (str): System path to the PDF document.
+        page_indices (range): Indices of the pages to process.
+        workers (int): Number of worker processes.
+        extract_batch (Callable[..., list]): Module level function run by the workers, called with the path, the 
+                                             index of the first and after the last page of a batch and `args`. 
+                                             Returns one result per page.
+        *args: Further arguments of `extract_batch`.
+
+    Returns:
+        Iterator: Result of each page, in order.
+    """
+    # several batches per worker, so early pages are passed on while later ones are still being processed
+    batch_size = max(1, -(-len(page_indices) // (workers * 4)))
+    batch_starts = range(page_indices.start, page_indices.stop, batch_size)
+    batch_stops = [min(batch_start + batch_size, page_indices.stop) for batch_start in batch_starts]
+    extra_args = [repeat(arg) for arg in args]
+    with ProcessPoolExecutor(max_workers=min(workers, max(1, len(batch_starts)))) as executor:
+        for results in executor.map(extract_batch, repeat(pdf_path), batch_starts, batch_stops, *extra_args):
+            yield from results
+
+
+def _extract_page_texts(
+        pdf_path: str,
+        start_idx: int,
+        stop_idx: int,
+        clean: bool
+) -> list[str]:
+    """
+    Helper function run by the worker processes of `_iter_page_texts_parallel()`.
+
+    Args:
+        pdf_path (str): System path to the PDF document.
+        start_idx (int): Index of the first page to extract.
+        stop_idx (int): Index after the last page to extract.
+        clean (bool): Whether to clean the text with `_clean_page_text()`.
+
+    Returns:
+        list[str]: Text content of each page, in order.
+    """
+    with pymupdf.open(pdf_path) as doc:
+        texts = [_get_page_text(page) for page in doc.pages(start_idx, stop_idx)]
+    return [_clean_page_text(text) for text in texts] if clean else texts
+
+
+# title of a MRL table, e.g. "Table 45"
+_TABLE_TITLE_REGEX = re.compile(r'Table\s*(\d+)')
+# MRL value, a trailing "*" marks a temporarily set limit. Spaces are removed before matching, as in "0. 5*"
+_MRL_VALUE_REGEX = re.compile(r'(\d+(?:\.\d+)?)\*?')
+# maximum distance in points between the left cell border and a category heading, foods are centered in the cell
+_CATEGORY_INDENT = 10
+
+
+def load_mrl_tables(
+        pdf_path: str | PDFSession,
+        start_page: int,
+        end_page: int,
+        workers: int = 1
+) -> pd.DataFrame:
+    """
+    Parses the Maximum Residue Limit tables in range of the specified pages, using the position of their words.
+    Expects the content of the pages to be the document mentioned above.
+
+    Every table is assigned the number of the "Table N" title above it, titles at the bottom of the previous 
+    page included. Tables without a header row continue the table of the previous page. Category headings 
+    (left-aligned, without a value) become rows of their own, with themselves as category and no MRL value. 
+    Rows which can't be read reliably, like foods without or with an unreadable value, are flagged as uncertain.
+
+    Args:
+        pdf_path (str | PDFSession): System path to the PDF document or an open `PDFSession`.
+        start_page (int): First page to load. Inclusive using page numbers (The numbers in the PDF-Viewer).
+        end_page (int): Last page to load. Inclusive using page numbers (The numbers in the PDF-Viewer).
+        workers (int): Number of processes parsing pages in parallel, 1 parses them in this process. 
+                       The tables are the same either way. Defaults to 1.
+
+    Returns:
+        pd.DataFrame: A DataFrame with the columns "table", "food", "category", "mrl" and "uncertain", in the 
+                      order of the document. "table" is None if the tables title couldn't be found.
+    """
+    ## faulty argument handling
+    session = _get_session(pdf_path)
+    for name, value in {"start_page": start_page, "end_page": end_page}.items():
+        if not isinstance(value, int):
+            raise TypeError(f"{name} must be an integer, got {type(value).__name__}")
+        if value < 0:
+            raise ValueError(f"{name} must be a non-negative integer, got {value}")
+    if end_page < start_page:
+        raise ValueError(f"`end_page` ({end_page}) must be greater than or equal to `start_page` ({start_page}).")
+    if start_page == 0:
+        raise ValueError("use pdf-page numbers instead of indices, first page is 1.")
+    _check_workers(workers)
+
+    ## parse tables page by page
+    page_indices = session.page_indices(start_page, end_page)
+    if workers > 1:
+        pages = _iter_pages_parallel(session.path, page_indices, workers, _extract_mrl_pages)
+    else:
+        pages = (_parse_mrl_page(page) for page in session.pages(page_indices))
+
+    ## stitch titles and categories across pages, in reading order
+    rows = []
+    # number of the last title which wasn't followed by its table yet
+    pending_table_number = None
+    table_number = None
+    category = None
+    for page_items in pages:
+        for title_number, has_header, table_rows, end_category in page_items:
+            if title_number is not None:
+                pending_table_number = title_number
+                continue
+            if has_header:
+                table_number = pending_table_number
+                pending_table_number = None
+                category = None
+            # rows above the first category heading of a table continue the category of the previous one
+            for row in table_rows:
+                rows.append({**row, "table": table_number, "category": row["category"] or category})
+            category = end_category or category
+
+    return pd.DataFrame(rows, columns=["table", "food", "category", "mrl", "uncertain"])
+
+
+def _parse_mrl_page(
+        page: pymupdf.Page
+) -> list[tuple[int | None, bool, list[dict], str | None]]:
+    """
+    Helper function that parses the titles and tables of a single page, independent of the pages before it. 
+    Table numbers and categories carried over from previous pages are filled in by `load_mrl_tables()`.
+
+    Args:
+        page (pymupdf.Page): Page to parse.
+
+    Returns:
+        list[tuple[int | None, bool, list[dict], str | None]]: Titles and tables in reading order, in the format 
+            (title number, has header, rows, category the table ends in). Titles only have a number, tables 
+            have no number and rows whose category is None if they come before the first category heading.
+    """
+    titles = [
+        (line[0], (int(match.group(1)), False, [], None))
+        for line in _get_lines(page, page.rect)
+        if (match := _TABLE_TITLE_REGEX.fullmatch(line[3]))
+    ]
+    tables = []
+    for table in page.find_tables().tables:
+        table_rows, end_category = _parse_mrl_table(page, table, None, None)
+        tables.append((table.bbox[1], (None, _has_header(page, table), table_rows, end_category)))
+    return [item for _, item in sorted(titles + tables, key=lambda item: item[0])]
+
+
+def _extract_mrl_pages(
+        pdf_path: str,
+        start_idx: int,
+        stop_idx: int
+) -> list[list[tuple[int | None, bool, list[dict], str | None]]]:
+    """
+    Helper function run by the worker processes of `load_mrl_tables()`.
+
+    Args:
+        pdf_path (str): System path to the PDF document.
+        start_idx (int): Index of the first page to parse.
+        stop_idx (int): Index after the last page to parse.
+
+    Returns:
+        list[list[tuple[int | None, bool, list[dict], str | None]]]: Titles and tables of each page as returned 
+            by `_parse_mrl_page()`, in order.
+    """
+    with pymupdf.open(pdf_path) as doc:
+        return [_parse_mrl_page(page) for page in doc.pages(start_idx, stop_idx)]
+
+
+def _get_lines(
+        page: pymupdf.Page,
+        rect: tuple | pymupdf.Rect
+) -> list[tuple[float, float, float, str]]:
+    """
+    Helper function that groups the words inside an area of a page into lines.
+
+    Args:
+        page (pymupdf.Page): Page to read from.
+        rect (tuple | pymupdf.Rect): Area of the page.
+
+    Returns:
+        list[tuple[float, float, float, str]]: Lines from top to bottom in the format (y0, y1, x0, text).
+    """
+    words = sorted(page.get_text("words", clip=pymupdf.Rect(rect)), key=lambda word: (word[1], word[0]))
+    lines = []
+    for x0, y0, x1, y1, word, *_ in words:
+        # words of the same line start at (almost) the same height
+        if lines and abs(lines[-1][0][1] - y0) < 3:
+            lines[-1].append((x0, y0, x1, y1, word))
+        else:
+            lines.append([(x0, y0, x1, y1, word)])
+    return [
+        (
+            min(word[1] for word in line),
+            max(word[3] for word in line),
+            min(word[0] for word in line),
+            " ".join(word[4] for word in sorted(line))
+        )
+        for line in lines
+    ]
+
+
+def _has_header(
+        page: pymupdf.Page,
+        table: pymupdf.table.Table
+) -> bool:
+    """
+    Helper function that checks if a table starts with the "Food category/name" header row.
+
+    Args:
+        page (pymupdf.Page): Page of the table.
+        table (pymupdf.table.Table): Table found by pymupdf.
+
+    Returns:
+        bool: Whether the table has a header row.
+    """
+    first_cell = table.rows[0].cells[0] if table.rows else None
+    if first_cell is None:
+        return False
+    lines = _get_lines(page, first_cell)
+    return bool(lines) and lines[0][3].lower().startswith("food category")
+
+
+def _parse_mrl_table(
+        page: pymupdf.Page,
+        table: pymupdf.table.Table,
+        table_number: int | None,
+        category: str | None
+) -> tuple[list[dict], str | None]:
+    """
+    Helper function that reads the food/MRL rows of a single table. Foods and values are matched by their
+    vertical position, as a single table row usually holds a whole category.
+
+    Args:
+        page (pymupdf.Page): Page of the table.
+        table (pymupdf.table.Table): Table found by pymupdf.
+        table_number (int | None): Number of the table.
+        category (str | None): Category the table starts in, set if it continues a table of the previous page.
+
+    Returns:
+        tuple[list[dict], str | None]: Parsed rows and the category the table ends in.
+    """
+    rows = []
+    # tables are expected to have exactly the two columns "food category/name" and "MRL"
+    uncertain_table = table.col_count != 2
+    for row in table.rows:
+        food_cell = row.cells[0]
+        value_cell = row.cells[-1] if len(row.cells) > 1 else None
+        if food_cell is None:
+            continue
+        food_lines = _get_lines(page, food_cell)
+        value_lines = _get_lines(page, value_cell) if value_cell is not None else []
+        # skip header rows and footnotes like "*means the limit is temporarily set."
+        if not food_lines or food_lines[0][3].lower().startswith("food category") or food_lines[0][3].startswith("*"):
+            continue
+
+        matched_values = set()
+        for y0, y1, x0, text in food_lines:
+            value = next((i for i, line in enumerate(value_lines) if line[0] < y1 and y0 < line[1]), None)
+            if value is None:
+                if x0 - food_cell[0] < _CATEGORY_INDENT:
+                    category = text
+                    rows.append({"table": table_number, "food": text, "category": text, "mrl": None, "uncertain": uncertain_table})
+                else:
+                    # a food without a value, e.g. a name broken into two lines
+                    rows.append({"table": table_number, "food": text, "category": category, "mrl": None, "uncertain": True})
+                continue
+            matched_values.add(value)
+            match = _MRL_VALUE_REGEX.fullmatch(value_lines[value][3].replace(" ", ""))
+            rows.append({
+                "table": table_number,
+                "food": text,
+                "category": category,
+                "mrl": float(match.group(1)) if match else None,
+                "uncertain": uncertain_table or match is None
+            })
+        # values without a food
+        if rows and len(matched_values) < len(value_lines):
+            rows[-1]["uncertain"] = True
+
+    return rows, category
@@ -9,91 +9,143 @@ import pandas as pd
 import re
 import yaml
 from config.load_config import settings
+from .food_matcher import match_foods
+from .llm_cache import cached_completion, discard_cached_completion
+from .llm_client import get_llm_executor
 
 
 def extract_relevant_values(
         user_prompt: str,
-        prompt_context: list[str]     
+        prompt_context: list[tuple[str, str, list[str]]]
 ) -> pd.DataFrame:
     """
     Prompts an LLM to extract Food/Maximum Residue Limit value pairs from the extracted context based on the users input. 
 
     Args:
         user_prompt (str): Keywords given by the user, split by ';'. This is not enforced by code, but is a requirement.
-        prompt_context list[str]: List of all sections of the PDF matching the users prompt.
+        prompt_context (list[tuple[str, str, list[str]]]): All sections of the PDF matching the users prompt, 
+            as rows of pesticide, section text and matched keywords.
 
     Returns:
-        pd.DataFrame: Pandas DataFrame with the columns ['pesiticide', 'food', 'mrl'] extracted from the given context by an LLM.
+        pd.DataFrame: Pandas DataFrame with the columns ['pesiticide', 'food', 'mrl', 'keyword'] extracted from the given context by an LLM, 
+            'keyword' holds the keyword each row was extracted for.
     """
     ## faulty argument handling
     if not isinstance(user_prompt, list):
         raise TypeError(f"'user_prompt' must be a list, got {type(user_prompt).__name__}")
 
     ## setup 
-    openai_client = openai.OpenAI(
-        base_url=settings.kipitz_base_url,
-        api_key=settings.kipitz_api_token
-    )
-
     with open(settings.prompt_path, "r", encoding="utf-8") as f:
         prompts = yaml.safe_load(f)
     base_value_extraction_prompt = prompts["value_extraction_prompt"]
 
-    extracted_data = []
     ## extract pesticides and values with context/text chunks
-    #TODO: takes a couple minutes for big prompt_context lists, perhaps parallelize?
-    for context in prompt_context:
-        pesticide = context[0]
-        text = context[1]
-        keyword = context[2]
-        prompt = base_value_extraction_prompt.format(
-            prompt=keyword,
-            pesticide=pesticide,
-            text=text
-        )
-        completion = openai_client.chat.completions.create(
-            model=settings.kipitz_model,
-            messages=[{"role": settings.kipitz_role, "content": prompt}],   
-        )
-        answer = completion.choices[0].message.content
-        try:
-            ## answer cleaning
-            clean_answer = answer.strip()
-            # ensure the answer starts with '[['
-            flat_start = re.sub(r'\s+', '', clean_answer[:10])
-            if not flat_start.startswith("[["):
-                clean_answer = "[[" + clean_answer.lstrip("[").lstrip()
-            # ensure the answer ends with ']]'
-            flat_end = re.sub(r'\s+', '', clean_answer[-10:])
-            if not flat_end.endswith("]]"):
-                clean_answer = clean_answer.rstrip()
-                if clean_answer.endswith("],"):
-                    clean_answer = clean_answer[:-1] + "]]"
-                elif clean_answer.endswith("]"):
-                    clean_answer += "]"
-                else:
-                    clean_answer += "]]"
-
-            answer = clean_answer
-
-            data_list = ast.literal_eval(answer)
-            # normalize to a list of lists, catch non nested lists
-            # is doubled logic with LLM drifting, but never change a running system
-            if isinstance(data_list, list):
-                if all(isinstance(item, list) for item in data_list):
-                    # already a list of lists
-                    normalized_data = data_list
-                else:
-                    normalized_data = [data_list]
-
-            normalized_data = [[pesticide] + sublist for sublist in normalized_data]
-            extracted_data += normalized_data
-        except (ValueError, SyntaxError) as e:
-            logging.warning(f"Error type: {type(e).__name__}, Message: {e}")
-            logging.warning(f"Not fully correctly formatted output by LLM. Check prompt, value has been lost! This was the LLMs answer: {completion.choices[0].message.content}\nand this the cleaned answer: {answer}")
-            pass
-
-    return pd.DataFrame(extracted_data, columns=['pesticide', 'food', 'mrl'])
+    # one prompt per section asking for all keywords found in it, sections are prompted concurrently on the 
+    # shared LLM threads, `map` returns the answers in the order of `prompt_context`
+    answers = get_llm_executor().map(
+        lambda context: _extract_values_from_context(base_value_extraction_prompt, context),
+        prompt_context
+    )
+    extracted_data = [row for rows in answers for row in rows]
+
+    return pd.DataFrame(extracted_data, columns=['pesticide', 'food', 'mrl', 'keyword'])
+
+
+def _extract_values_from_context(
+        base_value_extraction_prompt: str,
+        context: tuple[str, str, list[str]]
+) -> list[list]:
+    """
+    Helper function that prompts the LLM with a single section of the PDF and all keywords matched in it 
+    and cleans its answer.
+
+    Args:
+        base_value_extraction_prompt (str): Unformatted value extraction prompt.
+        context (tuple[str, str, list[str]]): Row holding the pesticide, the section text and the matched keywords.
+
+    Returns:
+        list[list]: Rows in the format [pesticide, food, mrl, keyword]. Empty if the LLMs answer could not be parsed. 
+            Rows whose keyword isn't one of the section are dropped.
+    """
+    pesticide = context[0]
+    text = context[1]
+    keywords = context[2]
+    prompt = base_value_extraction_prompt.format(
+        keywords=", ".join(f'"{keyword}"' for keyword in keywords),
+        pesticide=pesticide,
+        text=text
+    )
+    raw_answer = cached_completion(prompt)
+    answer = raw_answer
+    try:
+        ## answer cleaning
+        clean_answer = answer.strip()
+        # ensure the answer starts with '[['
+        flat_start = re.sub(r'\s+', '', clean_answer[:10])
+        if not flat_start.startswith("[["):
+            clean_answer = "[[" + clean_answer.lstrip("[").lstrip()
+        # ensure the answer ends with ']]'
+        flat_end = re.sub(r'\s+', '', clean_answer[-10:])
+        if not flat_end.endswith("]]"):
+            clean_answer = clean_answer.rstrip()
+            if clean_answer.endswith("],"):
+                clean_answer = clean_answer[:-1] + "]]"
+            elif clean_answer.endswith("]"):
+                clean_answer += "]"
+            else:
+                clean_answer += "]]"
+
+        answer = clean_answer
+
+        data_list = ast.literal_eval(answer)
+        # normalize to a list of lists, catch non nested lists
+        # is doubled logic with LLM drifting, but never change a running system
+        if isinstance(data_list, list):
+            if all(isinstance(item, list) for item in data_list):
+                # already a list of lists
+                normalized_data = data_list
+            else:
+                normalized_data = [data_list]
+        else:
+            raise ValueError(f"expected a list, got {type(data_list).__name__}")
+
+        # every row must belong to a keyword of the section, the LLM may misspell or make up keywords
+        section_keywords = {_normalize_keyword(keyword): keyword for keyword in keywords}
+        rows = []
+        for sublist in normalized_data:
+            if len(keywords) == 1 and len(sublist) in (2, 3):
+                # with a single keyword there is nothing to choose from
+                keyword = keywords[0]
+            elif len(sublist) == 3 and isinstance(sublist[2], str):
+                keyword = section_keywords.get(_normalize_keyword(sublist[2]))
+            else:
+                keyword = None
+            if keyword is None:
+                logging.warning(f"Dropped {sublist} extracted from \"{pesticide}\", it doesn't belong to any of the keywords {keywords}.")
+                continue
+            rows.append([pesticide, sublist[0], sublist[1], keyword])
+        return rows
+    except (ValueError, SyntaxError) as e:
+        logging.warning(f"Error type: {type(e).__name__}, Message: {e}")
+        logging.warning(f"Not fully correctly formatted output by LLM. Check prompt, value has been lost! This was the LLMs answer: {raw_answer}\nand this the cleaned answer: {answer}")
+        # don't keep malformed answers in the cache
+        discard_cached_completion(prompt)
+        return []
+
+
+def _normalize_keyword(
+        keyword: str
+) -> str:
+    """
+    Helper function that normalises a keyword for comparison, ignoring case and whitespace.
+
+    Args:
+        keyword (str): Keyword as given by the user or returned by the LLM.
+
+    Returns:
+        str: The normalised keyword.
+    """
+    return " ".join(keyword.casefold().split())
 
 
 def compare_values(
@@ -107,151 +159,310 @@ def compare_values(
 
     Args:
         chi_df (pd.DataFrame): DataFrame containing Chinese pesticide information.
-        eu_df (pd.DataFrame): DataFrame containing European pesticide information.
+        eu_df (pd.DataFrame): DataFrame containing European pesticide information, with the Chinese pesticide 
+            each row was fetched for in 'chi_pesticide'.
         bridge_table (dict): Dictionary mapping Chinese pesticide names to European pesticide names.
 
     Returns:
         pd.DataFrame: DataFrame comparing both datasets, including notes on the certainty of each result.
     """
-    # create the dataframe for the final comparison
-    comparison_dataframe = pd.DataFrame(
-        columns=[
-            "chi_pesticide",
-            "eu_pesticide",
-            "chi_food",
-            "eu_food",
-            "chi_mrl",
-            "eu_mrl",
-            "note",
-            "valid_mrl"
-        ])
-
     ## setup 
-    openai_client = openai.OpenAI(
-        base_url=settings.kipitz_base_url,
-        api_key=settings.kipitz_api_token
-    )
     with open(settings.prompt_path, "r", encoding="utf-8") as f:
         prompts = yaml.safe_load(f)
     compare_all_values_prompt = prompts["compare_all_values_prompt"]
 
     ## prompt the LLM
+    # get dataframe with just that pesticide and the values of its fitting european pesticides,
+    # EU pesticides matched to several Chinese ones are in eu_df once for each of them
     chi_pesticides = chi_df["pesticide"].unique().tolist()
+    pesticides = []
     for chi_pesticide in chi_pesticides:
-        # get dataframe with just that pesticide
-        # pesticide, food, mrl
         chi_pest_df = chi_df[chi_df["pesticide"] == chi_pesticide]
-        # get list of fitting european pesticides and their data
-        eu_pest_df_list = []
+        fitting_pesticides = bridge_table[chi_pesticide]
+        eu_pest_df = eu_df[eu_df["chi_pesticide"] == chi_pesticide] if fitting_pesticides else eu_df
+        pesticides.append((chi_pest_df, _get_eu_pest_dfs(eu_pest_df, fitting_pesticides)))
+    comparison_rows = _compare_pesticides(compare_all_values_prompt, pesticides)
+
+    return build_comparison(comparison_rows)
+
+
+def compare_pesticide_values(
+        compare_all_values_prompt: str,
+        chi_pest_df: pd.DataFrame,
+        eu_df: pd.DataFrame,
+        fitting_pesticides: list[str]
+) -> "ComparisonRows":
+    """
+    Prompts an LLM to match the European MRL values of the given EU pesticides to the values of a single Chinese pesticide. 
+    Lets pesticides be compared as soon as their own values are known, `build_comparison()` turns the rows of all 
+    pesticides into the same comparison `compare_values()` creates.
+
+    Args:
+        compare_all_values_prompt (str): Unformatted comparison prompt ("compare_all_values_prompt" of the prompt file).
+        chi_pest_df (pd.DataFrame): DataFrame containing the information of a single Chinese pesticide.
+        eu_df (pd.DataFrame): DataFrame containing the European information of (at least) the fitting pesticides.
+        fitting_pesticides (list[str]): Names of the European pesticides matched to the Chinese pesticide.
+
+    Returns:
+        ComparisonRows: Rows of the comparison of the pesticide.
+    """
+    return _compare_pesticides(
+        compare_all_values_prompt,
+        [(chi_pest_df, _get_eu_pest_dfs(eu_df, fitting_pesticides))]
+    )
+
 
+def _get_eu_pest_dfs(
+        eu_df: pd.DataFrame,
+        fitting_pesticides: list[str]
+) -> list[pd.DataFrame] | None:
+    """
+    Helper function that splits the European values of the fitting pesticides by pesticide.
+
+    Args:
+        eu_df (pd.DataFrame): DataFrame containing European pesticide information.
+        fitting_pesticides (list[str]): Names of the European pesticides matched to a Chinese pesticide.
+
+    Returns:
+        list[pd.DataFrame] | None: One DataFrame per fitting pesticide with values, None if no european counterpart was found.
+    """
+    if len(fitting_pesticides) == 0:
+        return None
+
+    eu_pest_df_list = []
+    for fitting_pesticide in fitting_pesticides:
+        match_df = eu_df[eu_df["eu_pesticide"]==fitting_pesticide]
+        # only add if the eu_pesticide dataframe actually still has the pesticide 
+        # -> is lost if its not yet applicable, as we only query for applicable values as of right now
+        if not match_df.empty:
+            eu_pest_df_list.append(match_df)
+    return eu_pest_df_list
+
+
+def _compare_pesticides(
+        compare_all_values_prompt: str,
+        pesticides: list[tuple[pd.DataFrame, list[pd.DataFrame] | None]]
+) -> "ComparisonRows":
+    """
+    Helper function that prompts the LLM once for every pair of Chinese and fitting European pesticide and 
+    collects the rows of the comparison.
+
+    Args:
+        compare_all_values_prompt (str): Unformatted comparison prompt.
+        pesticides (list[tuple[pd.DataFrame, list[pd.DataFrame] | None]]): Rows of the Chinese pesticide and the 
+            values of its fitting European pesticides as returned by `_get_eu_pest_dfs()`, one tuple per Chinese pesticide.
+
+    Returns:
+        ComparisonRows: Rows of the comparison, in the order of the Chinese and then the European pesticides.
+    """
+    # pairs are prompted concurrently on the shared LLM threads, `map` returns the answers in the order of `pairs`
+    pairs = [
+        (chi_pest_df, eu_pest_df)
+        for chi_pest_df, eu_pest_df_list in pesticides
+        for eu_pest_df in eu_pest_df_list or []
+    ]
+    pair_rows = list(get_llm_executor().map(
+        lambda pair: _compare_pesticide_pair(compare_all_values_prompt, *pair),
+        pairs
+    ))
+
+    comparison_rows = ComparisonRows()
+    pair_rows_iter = iter(pair_rows)
+    for chi_pest_df, eu_pest_df_list in pesticides:
         # if no european counterparts could be found to the chinese pesticide, add default line to final dataframe
-        if len(bridge_table[chi_pesticide]) == 0:
-            #TODO: maybe optimize this code, is currently just a (functioning) prove of concept
-            df_to_add = chi_df[chi_df["pesticide"]==chi_pesticide]
-            # pesticide, eu_pesticide, food, mrl
-            df_to_add.insert(1, 'eu_pesticide', "/")
-            # pesticide, eu_pesticide, food, eu_food, mrl
-            df_to_add.insert(3, 'eu_food', "/")
-            # pesticide, eu_pesticide, food, eu_food, mrl, eu_mrl
-            df_to_add.insert(5, 'eu_mrl', "/")
-            # pesticide, eu_pesticide, food, eu_food, mrl, eu_mrl, note
-            df_to_add.insert(6, 'note', "No fitting eu-pesticide found.")
-            # pesticide, eu_pesticide, food, eu_food, mrl, eu_mrl, note, valid_mrl
-            df_to_add.insert(7, 'valid_mrl', "/")
-            # swap column names with the ones from comparison df and append it to it
-            df_to_add_trimmed = pd.DataFrame(df_to_add.values, columns=comparison_dataframe.columns)
-            comparison_dataframe = pd.concat([comparison_dataframe, df_to_add_trimmed], ignore_index=True)
+        if eu_pest_df_list is None:
+            # only the columns of the comparison, chi_pest_df may carry more (e.g. the keyword)
+            comparison_rows.add_unmatched_rows(chi_pest_df[["pesticide", "food", "mrl"]])
             continue
+        for _ in eu_pest_df_list:
+            for row in next(pair_rows_iter):
+                comparison_rows.add_row(row)
+    return comparison_rows
 
-        # if there are possible european counterparts go through them, get applicable values out and prompt with those
-        for fitting_pesticide in bridge_table[chi_pesticide]:
-            match_df = eu_df[eu_df["eu_pesticide"]==fitting_pesticide]
-            # only add if the eu_pesticide dataframe actually still has the pesticide 
-            # -> is lost if its not yet applicable, as we only query for applicable values as of right now
-            if not match_df.empty:
-                eu_pest_df_list.append(match_df)
-
-        for eu_pest_df in eu_pest_df_list:
-            eu_pesticide = eu_pest_df["eu_pesticide"].iloc[0]
-            # build prompt
-            chi_data_csv_string = chi_pest_df[["food", "mrl"]].to_csv(index=False)
-            eu_data_csv_string = eu_pest_df[["food", "mrl"]].to_csv(index=False)
-            prompt = compare_all_values_prompt.format(
-                chinese=chi_data_csv_string,
-                european=eu_data_csv_string
-            )
-            # ask prompt
-            completion = openai_client.chat.completions.create(
-                model=settings.kipitz_model,
-                messages=[{"role": settings.kipitz_role, "content": prompt}],   
-            )
-            # get answer and put it into dataframe
-            answer = completion.choices[0].message.content
-            try:
-                ## answer cleaning
-                clean_answer = answer.strip()
-                # ensure the answer starts with '[['
-                flat_start = re.sub(r'\s+', '', clean_answer[:10])
-                if not flat_start.startswith("[["):
-                    clean_answer = "[[" + clean_answer.lstrip("[").lstrip()
-                # ensure the answer ends with ']]' or '],]'
-                open_count = clean_answer.count('[')
-                close_count = clean_answer.count(']')
-                if close_count < open_count:
-                    clean_answer += (']' * (open_count - close_count))
-                # insert missing commas between sublists if needed
-                if re.search(r"\]\s*\[", clean_answer):
-                    clean_answer = re.sub(r"\]\s*\[", "], [", clean_answer)
-
-                answer = clean_answer
-
-                data_list = ast.literal_eval(answer)
-                # normalize to a list of lists 
-                if isinstance(data_list, list):
-                    if all(isinstance(item, list) for item in data_list):
-                        # already a list of lists
-                        normalized_data_list = data_list
-                    else:
-                        normalized_data_list = [data_list]
-                for sublist in normalized_data_list:
-                    ## combine answer from LLM with the other infos to create a full row in the comparison DataFrame + sublist + -1 as temp mrl value
-                    row = [chi_pesticide, eu_pesticide] + sublist + [-1]
-                    comparison_dataframe.loc[len(comparison_dataframe)] = row
-            except (ValueError, SyntaxError) as e:
-                logging.warning(f"Error type: {type(e).__name__}, Message: {e}")
-                logging.warning(f"Not fully correctly formatted output by LLM. Check prompt, value has been lost! This was the LLMs answer: {completion.choices[0].message.content}\nand this the cleaned answer: {answer}")
-                pass
+
+def _compare_pesticide_pair(
+        compare_all_values_prompt: str,
+        chi_pest_df: pd.DataFrame,
+        eu_pest_df: pd.DataFrame
+) -> list[list]:
+    """
+    Helper function that compares the values of a Chinese and a fitting European pesticide. Foods which can be 
+    matched by name or synonym (see `food_matcher`) are compared directly, only the remaining ones are sent to 
+    the LLM, whose answer is cleaned. A failed request or malformed answer only loses the values of those foods.
+
+    Args:
+        compare_all_values_prompt (str): Unformatted comparison prompt.
+        chi_pest_df (pd.DataFrame): DataFrame containing the information of a single Chinese pesticide.
+        eu_pest_df (pd.DataFrame): DataFrame containing the information of a single European pesticide.
+
+    Returns:
+        list[list]: Rows of the comparison, in the order of chi_pest_df.
+    """
+    chi_pesticide = chi_pest_df["pesticide"].iloc[0]
+    eu_pesticide = eu_pest_df["eu_pesticide"].iloc[0]
+    # foods matched without the LLM, only the leftovers are sent to it
+    if settings.food_matching_enabled:
+        matched_rows, leftover_positions = match_foods(chi_pest_df, eu_pest_df)
+    else:
+        matched_rows, leftover_positions = [], list(range(len(chi_pest_df)))
+    rows = [[chi_pesticide, eu_pesticide] + row + [-1] for _, row in matched_rows]
+    if not leftover_positions:
+        return rows
+    leftover_df = chi_pest_df.iloc[leftover_positions]
+    llm_rows = _prompt_pesticide_pair(compare_all_values_prompt, chi_pesticide, eu_pesticide, leftover_df, eu_pest_df)
+    if not matched_rows:
+        return llm_rows
+
+    ## keep the order of chi_pest_df
+    # the LLM answers with the Chinese food first, rows of foods it renamed are put at the end
+    food_positions = {}
+    for position, food in zip(leftover_positions, leftover_df["food"].tolist()):
+        food_positions.setdefault(food, position)
+    positioned_rows = [(position, row) for (position, _), row in zip(matched_rows, rows)]
+    positioned_rows += [(food_positions.get(row[2], len(chi_pest_df)), row) for row in llm_rows]
+    # sort is stable, so the rows of the same food stay in the order of the answer
+    positioned_rows.sort(key=lambda positioned_row: positioned_row[0])
+    return [row for _, row in positioned_rows]
+
+
+def _prompt_pesticide_pair(
+        compare_all_values_prompt: str,
+        chi_pesticide: str,
+        eu_pesticide: str,
+        chi_pest_df: pd.DataFrame,
+        eu_pest_df: pd.DataFrame
+) -> list[list]:
+    """
+    Helper function that prompts the LLM with the values of a Chinese and a fitting European pesticide and 
+    cleans its answer.
+
+    Args:
+        compare_all_values_prompt (str): Unformatted comparison prompt.
+        chi_pesticide (str): Name of the Chinese pesticide.
+        eu_pesticide (str): Name of the European pesticide.
+        chi_pest_df (pd.DataFrame): Foods of the Chinese pesticide to compare.
+        eu_pest_df (pd.DataFrame): DataFrame containing the information of a single European pesticide.
+
+    Returns:
+        list[list]: Rows of the comparison, the rows before the first malformed one if the answer could only 
+            partially be parsed, empty if the request failed.
+    """
+    # build prompt
+    chi_data_csv_string = _get_prompt_csv(chi_pest_df)
+    eu_data_csv_string = _get_prompt_csv(eu_pest_df)
+    prompt = compare_all_values_prompt.format(
+        chinese=chi_data_csv_string,
+        european=eu_data_csv_string
+    )
+    # ask prompt, get answer and put it into rows
+    try:
+        raw_answer = cached_completion(prompt)
+    except openai.OpenAIError as e:
+        logging.warning(f"Comparing {chi_pesticide} with {eu_pesticide} failed, values have been lost! Error type: {type(e).__name__}, Message: {e}")
+        return []
+    answer = raw_answer
+    rows = []
+    try:
+        ## answer cleaning
+        clean_answer = answer.strip()
+        # ensure the answer starts with '[['
+        flat_start = re.sub(r'\s+', '', clean_answer[:10])
+        if not flat_start.startswith("[["):
+            clean_answer = "[[" + clean_answer.lstrip("[").lstrip()
+        # ensure the answer ends with ']]' or '],]'
+        open_count = clean_answer.count('[')
+        close_count = clean_answer.count(']')
+        if close_count < open_count:
+            clean_answer += (']' * (open_count - close_count))
+        # insert missing commas between sublists if needed
+        if re.search(r"\]\s*\[", clean_answer):
+            clean_answer = re.sub(r"\]\s*\[", "], [", clean_answer)
+
+        answer = clean_answer
+
+        data_list = ast.literal_eval(answer)
+        # normalize to a list of lists 
+        if not isinstance(data_list, list):
+            raise ValueError(f"expected a list, got {type(data_list).__name__}")
+        if all(isinstance(item, list) for item in data_list):
+            # already a list of lists
+            normalized_data_list = data_list
+        else:
+            normalized_data_list = [data_list]
+        for sublist in normalized_data_list:
+            ## combine answer from LLM with the other infos to create a full row in the comparison DataFrame + sublist + -1 as temp mrl value
+            row = [chi_pesticide, eu_pesticide] + sublist + [-1]
+            if len(row) != len(_COMPARISON_COLUMNS):
+                raise ValueError("cannot set a row with mismatched columns")
+            rows.append(row)
+    except (ValueError, SyntaxError) as e:
+        logging.warning(f"Error type: {type(e).__name__}, Message: {e}")
+        logging.warning(f"Not fully correctly formatted output by LLM. Check prompt, value has been lost! This was the LLMs answer: {raw_answer}\nand this the cleaned answer: {answer}")
+        # don't keep malformed answers in the cache
+        discard_cached_completion(prompt)
+
+    return rows
+
+
+def _get_prompt_csv(
+        pest_df: pd.DataFrame
+) -> str:
+    """
+    Helper function that writes the foods and MRLs of a pesticide for the comparison prompt. Numbers are always 
+    written as floats, so the prompt doesn't depend on whether the values came in an integer, float or object column.
+
+    Args:
+        pest_df (pd.DataFrame): DataFrame with the columns "food" and "mrl" of a single pesticide.
+
+    Returns:
+        str: The values as CSV.
+    """
+    mrl = pest_df["mrl"].map(
+        lambda value: float(value) if isinstance(value, (int, float, np.number)) and not isinstance(value, bool) else value
+    )
+    return pd.DataFrame({"food": pest_df["food"], "mrl": mrl.astype(object)}).to_csv(index=False)
+
+
+def build_comparison(
+        comparison_rows: "ComparisonRows"
+) -> pd.DataFrame:
+    """
+    Builds the comparison of the collected rows and determines the valid MRL for each entry.
+
+    Args:
+        comparison_rows (ComparisonRows): Rows of all compared pesticides, in the order they should appear in.
+
+    Returns:
+        pd.DataFrame: DataFrame comparing both datasets, including notes on the certainty of each result.
+    """
+    comparison_dataframe = comparison_rows.to_dataframe()
 
     ## set valid maximum residue limit values
     # column names as variables for easier access 
     chi, eu, valid = 'chi_mrl', 'eu_mrl', 'valid_mrl'
-    # replace -2 with "/"
-    comparison_dataframe[chi] = comparison_dataframe[chi].replace(-2, "/")
-    # convert MRL columns to numeric for comparison
-    comparison_dataframe[chi] = pd.to_numeric(comparison_dataframe[chi], errors='coerce')
-    comparison_dataframe[eu] = pd.to_numeric(comparison_dataframe[eu], errors='coerce')
+    # numeric MRL values, categories (-2) and missing values become NaN
+    chi_values = pd.to_numeric(comparison_dataframe[chi].replace(-2, "/"), errors='coerce').to_numpy(dtype=float)
+    eu_values = pd.to_numeric(comparison_dataframe[eu], errors='coerce').to_numpy(dtype=float)
+    has_chi = ~np.isnan(chi_values)
+    has_eu = ~np.isnan(eu_values)
     # check scenarios of which columns have a value and determine valid_mrl accordingly
-    # both missing -> "/"
-    both_na = comparison_dataframe[chi].isna() & comparison_dataframe[eu].isna()
-    comparison_dataframe.loc[both_na, valid] = np.nan
     # only eu present -> use EU value
-    only_eu = comparison_dataframe[chi].isna() & comparison_dataframe[eu].notna()
-    comparison_dataframe.loc[only_eu, valid] = comparison_dataframe.loc[only_eu, eu]
-    # only chi present and there is a fitting european pesticide -> default 0.1 and note
-    only_chi = comparison_dataframe[chi].notna() & comparison_dataframe[eu].isna() & (comparison_dataframe['eu_pesticide'].astype(str) != "/")
-    comparison_dataframe.loc[only_chi, valid] = 0.01
-    comparison_dataframe.loc[only_chi, 'note'] = "Defaults to 0.01, no value in EU. Check again."
+    only_eu = ~has_chi & has_eu
+    # only chi present and there is a fitting european pesticide -> default 0.01 and note
+    only_chi = has_chi & ~has_eu & (comparison_dataframe['eu_pesticide'].astype(str) != "/").to_numpy()
     # both present -> take min
-    both_present = comparison_dataframe[chi].notna() & comparison_dataframe[eu].notna()
-    comparison_dataframe.loc[both_present, valid] = np.minimum(
-        comparison_dataframe.loc[both_present, chi],
-        comparison_dataframe.loc[both_present, eu]
+    both_present = has_chi & has_eu
+    # otherwise there is no valid MRL
+    valid_values = np.select(
+        [only_eu, only_chi, both_present],
+        [eu_values, 0.01, np.minimum(chi_values, eu_values)],
+        default=np.nan
     )
+    comparison_dataframe.loc[only_chi, 'note'] = "Defaults to 0.01, no value in EU. Check again."
 
-    # replace NaNs with "/" again for better visual understanding (NaN may not be clear for non-programmers)
-    comparison_dataframe[chi] = comparison_dataframe[chi].astype(str).replace("nan", "/")
-    comparison_dataframe[eu] = comparison_dataframe[eu].astype(str).replace("nan", "/")
-    comparison_dataframe[valid] = comparison_dataframe[valid].astype(str).replace("nan", "/")
+    comparison_dataframe[chi] = _format_mrl(chi_values)
+    comparison_dataframe[eu] = _format_mrl(eu_values)
+    comparison_dataframe[valid] = _format_mrl(valid_values)
 
     # add . at the end of notes if they aren't there by default
     comparison_dataframe['note'] = comparison_dataframe['note'].apply(
@@ -259,4 +470,109 @@ def compare_values(
     )
     
     return comparison_dataframe
-        
\ No newline at end of file
+        
+
+
+# columns of the comparison created by `compare_values()`
+_COMPARISON_COLUMNS = [
+    "chi_pesticide",
+    "eu_pesticide",
+    "chi_food",
+    "eu_food",
+    "chi_mrl",
+    "eu_mrl",
+    "note",
+    "valid_mrl"
+]
+
+
+class ComparisonRows:
+    """
+    Collects the rows of the comparison created by `compare_values()` in one list per column and builds the 
+    DataFrame once, instead of growing it row by row.
+    """
+    def __init__(self) -> None:
+        self.columns = {column: [] for column in _COMPARISON_COLUMNS}
+
+    def add_row(
+            self,
+            row: list
+    ) -> None:
+        """
+        Adds a row of a pesticide with EU counterpart.
+
+        Args:
+            row (list): One value per column of the comparison.
+
+        Returns:
+            None
+        """
+        if len(row) != len(self.columns):
+            raise ValueError("cannot set a row with mismatched columns")
+        for values, value in zip(self.columns.values(), row):
+            values.append(value)
+
+    def extend(
+            self,
+            other: "ComparisonRows"
+    ) -> None:
+        """
+        Adds all rows of another collection, e.g. the rows of a single pesticide, after the rows added so far.
+
+        Args:
+            other (ComparisonRows): Rows to add.
+
+        Returns:
+            None
+        """
+        for column, values in self.columns.items():
+            values.extend(other.columns[column])
+
+    def add_unmatched_rows(
+            self,
+            chi_pest_df: pd.DataFrame
+    ) -> None:
+        """
+        Adds the rows of a pesticide without EU counterpart, "/" is filled in for all EU columns.
+
+        Args:
+            chi_pest_df (pd.DataFrame): DataFrame with the columns "pesticide", "food" and "mrl" of the pesticide.
+
+        Returns:
+            None
+        """
+        row_count = len(chi_pest_df)
+        self.columns["chi_pesticide"].extend(chi_pest_df["pesticide"].tolist())
+        self.columns["eu_pesticide"].extend(["/"] * row_count)
+        self.columns["chi_food"].extend(chi_pest_df["food"].tolist())
+        self.columns["eu_food"].extend(["/"] * row_count)
+        self.columns["chi_mrl"].extend(chi_pest_df["mrl"].tolist())
+        self.columns["eu_mrl"].extend(["/"] * row_count)
+        self.columns["note"].extend(["No fitting eu-pesticide found."] * row_count)
+        self.columns["valid_mrl"].extend(["/"] * row_count)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Builds the DataFrame of all added rows.
+
+        Returns:
+            pd.DataFrame: DataFrame with the columns of the comparison, in the order the rows were added.
+        """
+        # values are kept as they were added, only the MRL columns are typed by `build_comparison()`
+        return pd.DataFrame(self.columns, columns=_COMPARISON_COLUMNS, dtype=object)
+
+
+def _format_mrl(
+        values: np.ndarray
+) -> np.ndarray:
+    """
+    Helper function that turns MRL values into the strings shown in the comparison.
+
+    Args:
+        values (np.ndarray): MRL values as floats, NaN if there is none.
+
+    Returns:
+        np.ndarray: The values as strings, e.g. "3.0", "/" where there is no value (NaN may not be clear for 
+            non-programmers).
+    """
+    return pd.Series(values, dtype=float).astype(str).replace("nan", "/").to_numpy()
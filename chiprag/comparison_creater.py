@@ -3,16 +3,25 @@ Pipeline that creates and saves a pre-formatted Excel file comparing the Maximum
 """
 import logging
 import pandas as pd
+import queue
+import threading
+import time
+import yaml
+from collections.abc import Callable
 from openpyxl.styles import Font, PatternFill
+from config.load_config import settings
 from openpyxl.utils import get_column_letter
-from .postgres_utils import query_database
-from .chiprag_modules import extract_relevant_values, get_fitting_pesticides, compare_values
-from .postgres_utils import get_pesticide_data
+from .postgres_utils import query_database, get_parsed_pesticides, query_mrl_values
+from .chiprag_modules import extract_relevant_values, get_fitting_pesticides, get_pesticide_prompt_hash, compare_values, log_cache_stats, log_client_stats
+from .chiprag_modules import compare_pesticide_values, build_comparison, ComparisonRows
+from .postgres_utils import get_pesticide_data, get_pesticide_bridge, store_pesticide_bridge
 
 
 def create_comparison(
         keywords: list[str],
-        output_path: str
+        output_path: str,
+        ranked: bool = False,
+        pipelined: bool = True
 ) -> pd.DataFrame:
     """
     Generates a formatted Excel sheet comparing Chinese and European Maximum Residue Limit (MRL) values for specified pesticides and foods.
@@ -20,49 +29,73 @@ def create_comparison(
     Args:
         keywords (list[str] | str): Required to know which pesticides/foods should be compared.
         output_path (str): Path where the excel output should be saved to. Defaults to "output.xlsx" in the working directory.
+        ranked (bool): Whether the most relevant Chinese chunks should come first. Defaults to False.
+        pipelined (bool): Whether each pesticide moves on to matching and comparing as soon as its own values are known, 
+            instead of waiting for all pesticides to finish each step. Both create the same comparison. Defaults to True.
 
     Returns:
         pd.DataFrame: DataFrame with the exact same output as is in the excel sheet.
     """
     logging.info("-- Creating comparison --")
-    # get values which are relevant for comparison
-    chi_values = _get_chi_values(keywords)
-    if chi_values.empty:
-        logging.info("No values found, aborting comparison.")
-        return chi_values
-    logging.info("Got chinese values.")
-    eu_values, bridge_dict = _get_eu_values(chi_values)
-    logging.info("Got european values.")
-    # create comparison
-    comparison = compare_values(chi_values, eu_values, bridge_dict)
+    if pipelined:
+        comparison = _create_comparison_pipelined(keywords, ranked)
+        if comparison is None:
+            logging.info("No values found, aborting comparison.")
+            return pd.DataFrame()
+    else:
+        # get values which are relevant for comparison
+        chi_values = _get_chi_values(keywords, ranked)
+        if chi_values.empty:
+            logging.info("No values found, aborting comparison.")
+            return chi_values
+        logging.info("Got chinese values.")
+        eu_values, bridge_dict = _get_eu_values(chi_values)
+        logging.info("Got european values.")
+        # create comparison
+        comparison = compare_values(chi_values, eu_values, bridge_dict)
     logging.info("Created comparison.")
     # save as formatted excel
     formatted_comparsion = _render_to_xlsx(comparison, output_path)
     logging.info(f"Stored formatted excel sheet at {output_path}.")
+    log_cache_stats()
+    log_client_stats()
 
     return formatted_comparsion
 
 
 def _get_chi_values(
-        keywords: list[str]
+        keywords: list[str],
+        ranked: bool = False
 ) -> pd.DataFrame:
     """
     Helper function that retrieves all information for a given list of keywords from the GBs containing Chinese pesticide Maximum Residue Limit data.
+    Values of chapters whose tables were parsed at upload are looked up, only the remaining chapters are extracted by an LLM.
 
     Args:
         keywords (list[str]): List of pesticides and foods to gather information for. Keywords must exactly match the English translations of the GB.
+        ranked (bool): Whether the most relevant chunks should come first. Defaults to False.
 
     Returns:
-        pd.DataFrame: DataFrame containing all relevant information with columns: 'pesticide', 'food', and 'mrl'.
+        pd.DataFrame: DataFrame containing all relevant information with columns: 'pesticide', 'food', 'mrl' and 'keyword'.
     """
     # get all entries from the database
-    list = query_database(keywords)
+    list = query_database(keywords, ranked)
     if len(list) == 0:
          logging.warning("Couldn't find any values in the database fitting the users request. Check request and database accordingly.")
          return pd.DataFrame(list)
     
-    # filter out and return the relevant ones
-    return extract_relevant_values(keywords, list)
+    # look up the values of parsed chapters, let the LLM extract the rest
+    parsed_pesticides = get_parsed_pesticides([chunk[0] for chunk in list])
+    parsed_chunks = [chunk for chunk in list if chunk[0] in parsed_pesticides]
+    unparsed_chunks = [chunk for chunk in list if chunk[0] not in parsed_pesticides]
+    logging.info(f"Looking up values of {len(parsed_chunks)} chapters, extracting {len(unparsed_chunks)} with the LLM.")
+    chi_values = pd.DataFrame(query_mrl_values(parsed_chunks), columns=['pesticide', 'food', 'mrl', 'keyword'])
+    if unparsed_chunks:
+        chi_values = pd.concat([chi_values, extract_relevant_values(keywords, unparsed_chunks)], ignore_index=True)
+
+    # keep the order of the chapters, each chapter belongs to a single pesticide
+    chapter_order = chi_values['pesticide'].map({chunk[0]: i for i, chunk in enumerate(list)})
+    return chi_values.iloc[chapter_order.argsort(kind="stable")].reset_index(drop=True)
 
 
 def _get_eu_values(
@@ -79,37 +112,262 @@ def _get_eu_values(
         and a bridge dictionary mapping Chinese pesticide names to European pesticide names.
     """
     # get fitting eu_pesticides, dict that acts as a bridge between chi_values and eu_values
-    eu_pesticide_dict = get_fitting_pesticides(chi_values)
+    eu_pesticide_dict = _get_pesticide_bridge(chi_values)
     # get all data regarding those pesticides
     eu_pesticides_list = [item for sublist in eu_pesticide_dict.values() for item in sublist]
     eu_values = get_pesticide_data(eu_pesticides_list)
     # build dataframe
-    rows = []
-    for chi_pest, fitting_eu_pest in eu_pesticide_dict.items():
-        if len(fitting_eu_pest) == 0:
-            rows.append({
-                    'chi_pesticide': chi_pest,
-                    'eu_pesticide': "/",
-                    'food': "/",
-                    'mrl': "/"
-                    })
-            continue
-        
-        for eu_pest_key in fitting_eu_pest:
-            if eu_pest_key in eu_values:
-                for items in eu_values[eu_pest_key]:
-                    rows.append({
-                    'chi_pesticide': chi_pest,
-                    'eu_pesticide': items[0],
-                    'food': items[1],
-                    'mrl': items[2]
-                    })
-
-    eu_df = pd.DataFrame(rows)
+    rows = [
+        row
+        for chi_pest, fitting_eu_pest in eu_pesticide_dict.items()
+        for row in _get_eu_rows(chi_pest, fitting_eu_pest, eu_values)
+    ]
+    eu_df = pd.DataFrame(rows, columns=['chi_pesticide', 'eu_pesticide', 'food', 'mrl'])
 
     return eu_df, eu_pesticide_dict
 
 
+def _get_eu_rows(
+        chi_pest: str,
+        fitting_eu_pest: list[str],
+        eu_values: dict
+) -> list[dict]:
+    """
+    Helper function that builds the rows of European values belonging to a single Chinese pesticide.
+
+    Args:
+        chi_pest (str): Name of the Chinese pesticide.
+        fitting_eu_pest (list[str]): Names of the European pesticides matched to it.
+        eu_values (dict): Mapping of European pesticide names to their records, as returned by `get_pesticide_data()`.
+
+    Returns:
+        list[dict]: Rows with the keys 'chi_pesticide', 'eu_pesticide', 'food' and 'mrl', a single row of "/" 
+        if no European pesticide was matched.
+    """
+    if len(fitting_eu_pest) == 0:
+        return [{
+                'chi_pesticide': chi_pest,
+                'eu_pesticide': "/",
+                'food': "/",
+                'mrl': "/"
+                }]
+
+    rows = []
+    for eu_pest_key in fitting_eu_pest:
+        if eu_pest_key in eu_values:
+            for items in eu_values[eu_pest_key]:
+                rows.append({
+                'chi_pesticide': chi_pest,
+                'eu_pesticide': items[0],
+                'food': items[1],
+                'mrl': items[2]
+                })
+    return rows
+
+
+def _get_pesticide_bridge(
+        chi_values: pd.DataFrame
+) -> dict:
+    """
+    Helper function that maps the Chinese pesticides to European ones. Mappings stored in the database are 
+    reused, only pesticides without one are matched by the LLM and stored afterwards.
+
+    Args:
+        chi_values (pd.DataFrame): DataFrame containing all relevant Chinese values.
+
+    Returns:
+        dict: Dictionary in the format {chinese_pesticide: [european_pesticide, european_pesticide...]}, 
+        in the order of the Chinese pesticides.
+    """
+    chi_pesticides = chi_values["pesticide"].unique().tolist()
+    prompt_hash = get_pesticide_prompt_hash()
+    stored_dict = get_pesticide_bridge(chi_pesticides, settings.kipitz_model, prompt_hash)
+    logging.info(f"Reused {len(stored_dict)} of {len(chi_pesticides)} pesticide mappings.")
+
+    new_dict = {}
+    unseen_values = chi_values[~chi_values["pesticide"].isin(stored_dict.keys())]
+    if not unseen_values.empty:
+        new_dict = get_fitting_pesticides(unseen_values)
+        store_pesticide_bridge(new_dict, settings.kipitz_model, prompt_hash)
+
+    return {
+        chi_pest: stored_dict[chi_pest] if chi_pest in stored_dict else new_dict[chi_pest]
+        for chi_pest in chi_pesticides
+    }
+
+
+def _create_comparison_pipelined(
+        keywords: list[str],
+        ranked: bool = False
+) -> pd.DataFrame | None:
+    """
+    Helper function that creates the comparison pesticide by pesticide. Each Chinese pesticide is extracted, 
+    matched to European pesticides, looked up in the EU data and compared as soon as its own inputs are ready, 
+    so database and LLM requests of different pesticides overlap. The steps are connected by bounded queues.
+
+    Args:
+        keywords (list[str]): List of pesticides and foods to compare. Keywords must exactly match the English translations of the GB.
+        ranked (bool): Whether the most relevant chunks should come first. Defaults to False.
+
+    Returns:
+        pd.DataFrame | None: The comparison, in the same order `compare_values()` creates it in. None if no Chinese values were found.
+    """
+    # get all entries from the database
+    chunks = query_database(keywords, ranked)
+    if len(chunks) == 0:
+        logging.warning("Couldn't find any values in the database fitting the users request. Check request and database accordingly.")
+        return None
+
+    # each chapter belongs to a single pesticide, pesticides keep the position of their last chapter like in `_get_chi_values()`
+    chapter_order = {chunk[0]: i for i, chunk in enumerate(chunks)}
+    pesticide_chunks = {pesticide: [] for pesticide in sorted(chapter_order, key=chapter_order.get)}
+    for chunk in chunks:
+        pesticide_chunks[chunk[0]].append(chunk)
+
+    # the few lookups which cover all pesticides are done once upfront
+    parsed_pesticides = get_parsed_pesticides(list(pesticide_chunks))
+    logging.info(f"Looking up values of {len(parsed_pesticides)} pesticides, extracting {len(pesticide_chunks) - len(parsed_pesticides)} with the LLM.")
+    prompt_hash = get_pesticide_prompt_hash()
+    stored_dict = get_pesticide_bridge(list(pesticide_chunks), settings.kipitz_model, prompt_hash)
+    logging.info(f"Reused {len(stored_dict)} of {len(pesticide_chunks)} pesticide mappings.")
+
+    with open(settings.prompt_path, "r", encoding="utf-8") as f:
+        compare_all_values_prompt = yaml.safe_load(f)["compare_all_values_prompt"]
+
+    # the extraction and comparison of a pesticide fan out on the shared LLM threads instead of opening their own, 
+    # the LLM client limits the requests of all steps together
+    start_time = time.perf_counter()
+
+    def extract(item: tuple[str, list]) -> pd.DataFrame | None:
+        pesticide, chunks = item
+        if pesticide in parsed_pesticides:
+            chi_pest_df = pd.DataFrame(query_mrl_values(chunks), columns=['pesticide', 'food', 'mrl', 'keyword'])
+        else:
+            chi_pest_df = extract_relevant_values(keywords, chunks)
+        return None if chi_pest_df.empty else chi_pest_df
+
+    def match(chi_pest_df: pd.DataFrame) -> tuple[pd.DataFrame, list[str]]:
+        pesticide = chi_pest_df["pesticide"].iloc[0]
+        if pesticide in stored_dict:
+            return chi_pest_df, stored_dict[pesticide]
+        new_dict = get_fitting_pesticides(chi_pest_df)
+        store_pesticide_bridge(new_dict, settings.kipitz_model, prompt_hash)
+        return chi_pest_df, new_dict[pesticide]
+
+    def fetch_eu_values(item: tuple[pd.DataFrame, list[str]]) -> tuple[pd.DataFrame, list[str], pd.DataFrame]:
+        chi_pest_df, fitting_eu_pest = item
+        eu_values = get_pesticide_data(fitting_eu_pest)
+        eu_rows = _get_eu_rows(chi_pest_df["pesticide"].iloc[0], fitting_eu_pest, eu_values)
+        # keep the columns even if none of the matched pesticides has applicable values
+        eu_df = pd.DataFrame(eu_rows, columns=['chi_pesticide', 'eu_pesticide', 'food', 'mrl'])
+        return chi_pest_df, fitting_eu_pest, eu_df
+
+    def compare(item: tuple[pd.DataFrame, list[str], pd.DataFrame]) -> ComparisonRows:
+        chi_pest_df, fitting_eu_pest, eu_df = item
+        comparison_rows = compare_pesticide_values(compare_all_values_prompt, chi_pest_df, eu_df, fitting_eu_pest)
+        logging.info(f"Compared {chi_pest_df['pesticide'].iloc[0]} after {time.perf_counter() - start_time:.1f}s.")
+        return comparison_rows
+
+    pesticide_comparisons = _run_pipeline(
+        list(pesticide_chunks.items()),
+        [
+            (extract, settings.llm_max_workers),
+            (match, settings.llm_max_workers),
+            (fetch_eu_values, settings.postgre_pool_max_size),
+            (compare, settings.llm_max_workers)
+        ]
+    )
+    if len(pesticide_comparisons) == 0:
+        return None
+
+    comparison_rows = ComparisonRows()
+    for pesticide_comparison in pesticide_comparisons:
+        comparison_rows.extend(pesticide_comparison)
+    return build_comparison(comparison_rows)
+
+
+# marks the end of the items in a queue of `_run_pipeline()`
+_END_OF_ITEMS = object()
+
+
+def _run_pipeline(
+        items: list,
+        stages: list[tuple[Callable, int]]
+) -> list:
+    """
+    Helper function that passes each item through all stages, one after another. Every stage runs in its own 
+    worker threads and hands its results to the next stage through a bounded queue, so an item moves on as soon as 
+    it's done instead of waiting for the other items.
+
+    If a stage fails, the remaining items are dropped and the first error is raised once all workers stopped.
+
+    Args:
+        items (list): Inputs of the first stage.
+        stages (list[tuple[Callable, int]]): Function and number of worker threads of each stage. Each function 
+            gets the result of the previous stage, returning None drops the item.
+
+    Returns:
+        list: Results of the last stage, in the order of their items.
+    """
+    queues = [queue.Queue(maxsize=settings.comparison_queue_size) for _ in stages] + [queue.Queue()]
+    running_workers = [workers for _, workers in stages]
+    errors = []
+    failed = threading.Event()
+    lock = threading.Lock()
+
+    def feed() -> None:
+        for position, item in enumerate(items):
+            if failed.is_set():
+                break
+            queues[0].put((position, item))
+        for _ in range(stages[0][1]):
+            queues[0].put(_END_OF_ITEMS)
+
+    def work(stage: int) -> None:
+        function = stages[stage][0]
+        while (entry := queues[stage].get()) is not _END_OF_ITEMS:
+            # after a failure the queue is still emptied, so no stage blocks on a full queue
+            if failed.is_set():
+                continue
+            position, item = entry
+            try:
+                result = function(item)
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+                failed.set()
+                continue
+            if result is not None:
+                queues[stage + 1].put((position, result))
+        # the last worker of a stage tells the workers of the next one that no more items follow
+        with lock:
+            running_workers[stage] -= 1
+            last_worker = running_workers[stage] == 0
+        if last_worker:
+            next_workers = stages[stage + 1][1] if stage + 1 < len(stages) else 1
+            for _ in range(next_workers):
+                queues[stage + 1].put(_END_OF_ITEMS)
+
+    threads = [threading.Thread(target=feed, daemon=True)] + [
+        threading.Thread(target=work, args=(stage,), daemon=True)
+        for stage, (_, workers) in enumerate(stages)
+        for _ in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    results = {}
+    while (entry := queues[-1].get()) is not _END_OF_ITEMS:
+        position, result = entry
+        results[position] = result
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+    return [results[position] for position in sorted(results)]
+
+
 def _render_to_xlsx(
         comparsion_df: pd.DataFrame, 
         output_path: str
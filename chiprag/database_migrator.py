@@ -0,0 +1,54 @@
+"""
+Creates and maintains the indexes and tables chipRAG expects in the PostgreSQL database.
+"""
+import logging
+import yaml
+from config.load_config import settings
+from .postgres_utils import execute_statements, get_data
+
+
+def migrate_database(
+        reindex: bool = False,
+        rename_pesticides: bool = False
+) -> None:
+    """
+    Applies all schema migrations listed in the query file. Migrations are idempotent, so this can be run 
+    after every update of chipRAG.
+
+    Args:
+        reindex (bool): Whether to additionally rebuild the indexes and refresh the planner statistics, 
+            e.g. after uploading several new documents. Defaults to False.
+        rename_pesticides (bool): Whether to collapse the whitespace in the pesticide names of chapters uploaded 
+            by earlier versions of chipRAG. Names which only differ in whitespace are merged, keeping the newest 
+            version. This can't be undone, so the affected names are logged first and without this option the 
+            names are only reported. Defaults to False.
+
+    Returns:
+        None
+    """
+    logging.info("-- Migrating database --")
+    with open(settings.query_path, "r", encoding="utf-8") as f:
+        queries = yaml.safe_load(f)
+
+    execute_statements(queries["schema_migrations"])
+    logging.info("Applied schema migrations.")
+
+    renames = get_data(queries["get_pesticide_renames_query"])
+    if renames:
+        for name, chapters in renames:
+            if len(chapters) > 1:
+                logging.warning(f"Chapters {', '.join(chapters)} collapse into \"{name}\", only {chapters[0]} is kept.")
+        if rename_pesticides:
+            execute_statements(queries["rename_pesticides_queries"])
+            logging.info(f"Renamed the chapters of {len(renames)} pesticides.")
+        else:
+            logging.info(f"The chapters of {len(renames)} pesticides are stored with extra whitespace in their name, "
+                         "run `python chiprag.py db --rename-pesticides` to rename them.")
+
+    if reindex:
+        execute_statements(queries["maintenance_queries"], single_transaction=False)
+        logging.info("Rebuilt indexes and refreshed statistics.")
+
+
+if __name__ == "__main__":
+    migrate_database()
@@ -2,46 +2,99 @@
 Pipeline to read in a PDF, chunk it accordingly and upload it into a PostgreSQL database.
 """
 import logging
-from .chiprag_modules import load_pesticide_chapters, load_pesticide_names_from_outline, chunk_report_by_sections
-from .postgres_utils import upload_dataframe
+import pandas as pd
+from collections.abc import Iterator
+from itertools import islice
+from .chiprag_modules import PDFSession, iter_pesticide_chapter_pages, load_pesticide_names_from_outline, load_pesticide_toc, iter_report_sections, load_mrl_tables, chunk_mrl_tables
+from .postgres_utils import upload_document_chapters
 
 
 def upload_document(
         document: str,
         document_version: str,
-        begin_outline: int,
-        end_outline: int,
-        begin_tables: int,
-        end_tables: int,
-        pest_chapter_number: int
+        begin_outline: int | None = None,
+        end_outline: int | None = None,
+        begin_tables: int | None = None,
+        end_tables: int | None = None,
+        pest_chapter_number: int = 4,
+        batch_size: int = 50,
+        workers: int = 1
 ) -> None:
     """
     Uploads a document containing Chinese pesticide residue values.
+    Besides the chapters, the MRL tables are parsed and stored as structured values, so comparisons can look 
+    them up instead of extracting them with an LLM.
+
+    The document is read page by page and its chapters are uploaded in batches as soon as they are complete, 
+    so the text of the whole document is never held in memory at once. All batches are written in a single 
+    transaction, an upload failing halfway through leaves the stored document unchanged.
+
+    The pesticide chapters and their pages are taken from the bookmarks of the document if it has them, see 
+    `load_pesticide_toc()`. Then no page numbers are needed, given table pages still take precedence. Only 
+    documents without bookmarks are read from the outline pages.
 
     Args:
         document (str): Path to PDF document which is to be scanned in.
         document_version (str): Version of the document, following the style of \"GB2021-001\", \"GB2021-002\", \"GB2022-001\"...
-        begin_outline (int): First page where the outline in which pesticides are listed begins.
-        end_outline (int): Last page which holds the outline in which the pesticides are listed.
-        begin_tables (int): First page which holds information/tables relevant to you.
-        end_tables (int): ast page which holds information/tables relevant to you.
-        pest_chapter_number (int): Chapter number with which pesticide sections begin. For example 4 for \"4.15 Zo\"
+        begin_outline (int | None): First page where the outline in which pesticides are listed begins. 
+                                    Only needed for documents without bookmarks.
+        end_outline (int | None): Last page which holds the outline in which the pesticides are listed. 
+                                  Only needed for documents without bookmarks.
+        begin_tables (int | None): First page which holds information/tables relevant to you. Defaults to the 
+                                   first page of the pesticide chapters found in the bookmarks.
+        end_tables (int | None): Last page which holds information/tables relevant to you. Defaults to the 
+                                 last page of the pesticide chapters found in the bookmarks.
+        pest_chapter_number (int): Chapter number with which pesticide sections begin. For example 4 for \"4.15 Zo\". Defaults to 4.
+        batch_size (int): Number of chapters uploaded together. Defaults to 50.
+        workers (int): Number of processes extracting the text and parsing the MRL tables of the pages in parallel. 
+                       Defaults to 1.
 
     Returns:
         None
     """
+    if batch_size < 1:
+        raise ValueError(f"'batch_size' must be at least 1, got {batch_size}")
+
     logging.info("-- Uploading new document to database --")
-    # load pdf
-    pdf_text = load_pesticide_chapters(document, begin_tables, end_tables)
-    pdf_outline = load_pesticide_names_from_outline(document, begin_outline, end_outline, pest_chapter_number)
-    logging.info("Read in PDF.")
-    
-    # chunk loaded pdf into its sections
-    chunk_df = chunk_report_by_sections(pdf_text, pdf_outline, document_version)
-    logging.info("Chunked PDF.")
-
-    # upload chunks
-    upload_dataframe(chunk_df)
+    # the document is read and parsed once for outline, tables and chapters
+    with PDFSession(document) as pdf:
+        # find pesticide chapters, in the bookmarks if possible
+        toc = load_pesticide_toc(pdf, pest_chapter_number)
+        if toc is not None:
+            pdf_outline, toc_begin, toc_end = toc
+            begin_tables = toc_begin if begin_tables is None else begin_tables
+            end_tables = toc_end if end_tables is None else end_tables
+            logging.info(f"Found {len(pdf_outline)} pesticide chapters on pages {begin_tables}-{end_tables} in the bookmarks.")
+        else:
+            if None in (begin_outline, end_outline, begin_tables, end_tables):
+                raise ValueError("the document has no bookmarks for its pesticide chapters, the outline and table pages are required.")
+            pdf_outline = load_pesticide_names_from_outline(pdf, begin_outline, end_outline, pest_chapter_number, workers)
+
+        # load MRL tables, the tables are assigned to the chapters batch by batch
+        table_df = load_mrl_tables(pdf, begin_tables, end_tables, workers)
+        logging.info("Read in outline and MRL tables.")
+
+        # chunk the pdf into its sections while reading it
+        pdf_pages = iter_pesticide_chapter_pages(pdf, begin_tables, end_tables, workers)
+        sections = iter_report_sections(pdf_pages, pdf_outline)
+        counts = {"chapters": 0, "mrl": 0, "uncertain": 0}
+
+        def iter_batches() -> Iterator[tuple[pd.DataFrame, pd.DataFrame]]:
+            while batch := list(islice(sections, batch_size)):
+                chunk_df = pd.DataFrame(batch, columns=["pesticide", "text"])
+                chunk_df["version"] = document_version
+                mrl_df = chunk_mrl_tables(chunk_df, table_df)
+                yield chunk_df, mrl_df
+                # the batch has been written once the next one is asked for
+                counts["chapters"] += len(chunk_df)
+                counts["mrl"] += len(mrl_df)
+                counts["uncertain"] += int(mrl_df["uncertain"].sum())
+                logging.info(f"Wrote {counts['chapters']} chapters.")
+
+        # upload chunks, all batches are committed together at the end
+        upload_document_chapters(iter_batches())
+
+    logging.info(f"Parsed {counts['mrl']} MRL values, {counts['uncertain']} of them uncertain.")
     logging.info("Upload complete.")
 
 
@@ -2,25 +2,65 @@
 Fetches pesticide data from the EU API, cleans it, and stores it in a PostgreSQL database.
 """
 import logging
-from .chiprag_modules import eu_fetch_api
-from .postgres_utils import store_pesticide_data
+from .chiprag_modules import eu_fetch_api, load_snapshot, load_snapshot_metadata, save_snapshot
+from .postgres_utils import store_pesticide_data, sync_pesticide_data
 
 
-def update_eu_data() -> None:
+def update_eu_data(
+        full_reload: bool = False,
+        offline: bool = False,
+        force: bool = False
+) -> None:
     """
     Retrieves pesticide and Maximum Residue Limit (MRL) data from the EU DataLake.
     Cleans the data and uploads it to a PostgreSQL database.    
 
+    By default only rows which changed since the last update are written to the database. The cleaned data 
+    is kept as a local snapshot; if the DataLake didn't change since it was taken, neither the download nor 
+    the database write happen. A full reload then rebuilds the database from the snapshot instead.
+
+    Args:
+        full_reload (bool): Whether to replace all stored rows instead of applying only the changes, even if the DataLake 
+            didn't change. Defaults to False.
+        offline (bool): Whether to rebuild the database from the local snapshot instead of the DataLake. Defaults to False.
+        force (bool): Whether to download and store the data even if the DataLake didn't change. Defaults to False.
+
     Returns:
         None
     """
     logging.info("-- Fetching and uploading new data from EU-Database --")
-    applicable, ny_applicable = eu_fetch_api()
-    print("Got Data from EU-API.")
-    store_pesticide_data(
-        applicable_data=applicable,
-        not_yet_applicable_data=ny_applicable)
-    print("Stored EU Data. Upload/Update complete.")
+    if offline:
+        applicable, ny_applicable = load_snapshot()
+        metadata = None
+        print("Got Data from local snapshot.")
+    else:
+        result = eu_fetch_api(previous_metadata=None if force else load_snapshot_metadata())
+        if result is None and not full_reload:
+            print("EU Data didn't change since the last update. Nothing to do.")
+            return
+        if result is None:
+            # the snapshot holds the current data, a full reload doesn't need to download it again
+            applicable, ny_applicable = load_snapshot()
+            metadata = None
+            print("EU Data didn't change since the last update, got Data from local snapshot.")
+        else:
+            applicable, ny_applicable, metadata = result
+            print("Got Data from EU-API.")
+
+    if full_reload:
+        store_pesticide_data(
+            applicable_data=applicable,
+            not_yet_applicable_data=ny_applicable)
+        print("Stored EU Data. Upload/Update complete.")
+    else:
+        counts = sync_pesticide_data(
+            applicable_data=applicable,
+            not_yet_applicable_data=ny_applicable)
+        print(f"Synced EU Data ({counts['inserted']} inserted, {counts['updated']} updated, {counts['deleted']} deleted). Upload/Update complete.")
+
+    # only take the snapshot once the data is in the database, otherwise a failed upload would never be retried
+    if metadata is not None:
+        save_snapshot(applicable, ny_applicable, metadata)
     
 
 if __name__ == "__main__":
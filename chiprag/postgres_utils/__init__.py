@@ -1,3 +1,5 @@
-from .chi_postgres_store import upload_dataframe, query_database
-from .eu_postgres_store import get_pesticide_data, store_pesticide_data, get_all_pesticides
-from .util_postgres_store import establish_connection, get_data
+from .chi_postgres_store import upload_dataframe, query_database, upload_mrl_values, upload_document_chapters, get_parsed_pesticides, query_mrl_values
+from .bridge_postgres_store import get_pesticide_bridge, store_pesticide_bridge
+from .eu_reference_index import EUReferenceIndex, get_eu_reference_index
+from .eu_postgres_store import get_pesticide_data, store_pesticide_data, sync_pesticide_data, get_all_pesticides
+from .util_postgres_store import establish_connection, get_connection, get_data, execute_statements
@@ -0,0 +1,104 @@
+"""
+Functions for saving and retrieving the mapping of Chinese to EU pesticide names (the pesticide bridge) in a
+PostgreSQL database.
+
+Entries are stored together with the model and prompt they were derived with and the EU pesticide list they
+were matched against. Loading a different EU pesticide list invalidates them, see `stamp_eu_dataset_query`.
+"""
+import yaml
+from config.load_config import settings
+from psycopg2 import DatabaseError, ProgrammingError
+from psycopg2.extras import execute_values
+from .util_postgres_store import ensure_tables, get_connection
+
+
+def get_pesticide_bridge(
+        chi_pesticides: list[str],
+        model: str,
+        prompt_hash: str
+) -> dict:
+    """
+    Fetches the stored EU pesticide names for the given Chinese pesticides.
+
+    Args:
+        chi_pesticides (list[str]): Names of the Chinese pesticides to look up.
+        model (str): Model the mapping must have been derived with.
+        prompt_hash (str): Hash of the prompt the mapping must have been derived with.
+
+    Returns:
+        dict: Dictionary in the format {chinese_pesticide: [european_pesticide, european_pesticide...]},
+            Chinese pesticides without a valid entry are left out.
+    """
+    with open(settings.query_path, "r", encoding="utf-8") as f:
+        queries = yaml.safe_load(f)
+    query = queries["get_pesticide_bridge_query"]
+
+    ensure_tables(["eu_dataset_version", "pesticide_bridge"])
+
+    with get_connection() as (conn, cur):
+        try:
+            cur.execute(query, (list(chi_pesticides), model, prompt_hash))
+            res = cur.fetchall()
+        except DatabaseError as e:
+            print(f"database error while trying to run SQL on postgre database: {e}")
+            conn.rollback()
+            raise
+        except ProgrammingError as e:
+            print(f"programming error while trying to run SQL on postgre database: {e}")
+            conn.rollback()
+            raise
+        except Exception as e:
+            print(f"unexpected error: {e}")
+            conn.rollback()
+            raise
+
+    return {chi_pest: eu_pesticides for chi_pest, eu_pesticides in res}
+
+
+def store_pesticide_bridge(
+        bridge_dict: dict,
+        model: str,
+        prompt_hash: str
+) -> None:
+    """
+    Stores the EU pesticide names matched to Chinese pesticides, tagged with the current EU dataset version.
+
+    Args:
+        bridge_dict (dict): Dictionary in the format {chinese_pesticide: [european_pesticide, european_pesticide...]}.
+        model (str): Model the mapping was derived with.
+        prompt_hash (str): Hash of the prompt the mapping was derived with.
+
+    Returns:
+        None
+    """
+    # only well-formed answers are worth keeping
+    data = [
+        (chi_pest, model, prompt_hash, [str(eu_pest) for eu_pest in eu_pesticides])
+        for chi_pest, eu_pesticides in bridge_dict.items()
+        if isinstance(eu_pesticides, list)
+    ]
+    if not data:
+        return
+
+    with open(settings.query_path, "r", encoding="utf-8") as f:
+        queries = yaml.safe_load(f)
+    upsert_query = queries["upsert_pesticide_bridge_query"]
+
+    ensure_tables(["eu_dataset_version", "pesticide_bridge"])
+
+    with get_connection() as (conn, cur):
+        try:
+            execute_values(cur, upsert_query, data, template="(%s, %s, %s, %s::text[])")
+            conn.commit()
+        except DatabaseError as e:
+            print(f"database error while trying to run SQL on postgre database: {e}")
+            conn.rollback()
+            raise
+        except ProgrammingError as e:
+            print(f"programming error while trying to run SQL on postgre database: {e}")
+            conn.rollback()
+            raise
+        except Exception as e:
+            print(f"unexpected error: {e}")
+            conn.rollback()
+            raise
@@ -3,11 +3,13 @@ Collection of functions to send data to and get data from a PostgreSQL database
 somewhat unconventional RAG pipeline.
 """
 import pandas as pd
+import psycopg2
 import yaml
+from collections.abc import Iterable
 from config.load_config import settings
 from psycopg2 import DatabaseError, ProgrammingError
 from psycopg2.extras import execute_values
-from .util_postgres_store import establish_connection
+from .util_postgres_store import ensure_tables, get_connection
 
 
 def upload_dataframe(
@@ -19,8 +21,6 @@ def upload_dataframe(
 
     Args:
         df (pd.DataFrame): The Pandas DataFrame which is to be uploaded.
-        conn (psycopg2 Connection Object): Connection Object to perform actions with the database.
-        close_conn_afterwards (bool): Variable to decide whether to close the Connection Object after use. Defaults to True.
 
     Returns:
         None
@@ -35,47 +35,41 @@ def upload_dataframe(
         queries = yaml.safe_load(f)
     upsert_query = queries["upsert_chinese_query"]
 
-    # connect to database
-    conn, cur = establish_connection()
-
-    # turn dataframe into list, dataframe must have the two specified columns!
-    data = [(row['pesticide'], row['text'], row['version']) for _, row in df.iterrows()]
-
     # run SQL with data on database
-    try:
-        execute_values(cur, upsert_query, data)
-        conn.commit()
-    except DatabaseError as e:
-        print(f"database error while trying to run SQL on postgre database: {e}")
-        conn.rollback()
-        raise
-    except ProgrammingError as e:
-        print(f"programming error while trying to run SQL on postgre database: {e}")
-        conn.rollback()
-        raise
-    except Exception as e:
-        print(f"unexpected error: {e}")
-        conn.rollback()
-        raise
-    finally:
-        cur.close()
-        conn.close()
+    with get_connection() as (conn, cur):
+        try:
+            _upsert_chunks(cur, upsert_query, df)
+            conn.commit()
+        except DatabaseError as e:
+            print(f"database error while trying to run SQL on postgre database: {e}")
+            conn.rollback()
+            raise
+        except ProgrammingError as e:
+            print(f"programming error while trying to run SQL on postgre database: {e}")
+            conn.rollback()
+            raise
+        except Exception as e:
+            print(f"unexpected error: {e}")
+            conn.rollback()
+            raise
 
 
 def query_database(
         keywords: list[str],
-) -> list[str]:
+        ranked: bool = False
+) -> list[tuple[str, str, list[str]]]:
     '''
-    Queries the database using the provided Connection object.  
-    Performs a fuzzy word match for single keywords and an exact 'ILIKE' match for keyphrases.
+    Queries the database for all chunks containing at least one of the keywords.
+    Performs a case-insensitive 'ILIKE' match for all keywords in a single round-trip.
 
     Args:
-        user_prompt (str): Keywords given by the user, split by ';'. This is not enforced by code, but is a requirement.
-        conn (Psycopg2 Connection Object): Connection Object to perform actions with the database.
-        close_conn_afterwards (bool): Variable to decide whether to close the Connection Object after use. Defaults to True.
+        keywords (list[str]): Keywords given by the user, like pesticide or food names.
+        ranked (bool): Whether to put the most relevant chunks first instead of ordering them by keyword. 
+            Requires the pg_trgm extension, see `python chiprag.py db`. Defaults to False.
 
     Returns:
-        list[str]: List of all rows matching the SQL-query.
+        list[tuple[str, str, list[str]]]: One row per matching chunk, holding the pesticide, the chunk text 
+        and all keywords found in the chunk.
     '''
     ## faulty argument handling
     if not isinstance(keywords, list):
@@ -85,34 +79,276 @@ def query_database(
     # load SQL-queries
     with open(settings.query_path, "r", encoding="utf-8") as f:
         queries = yaml.safe_load(f)
-    get_query = queries["get_fitting_chinese_chunks_query"]
+    get_query = queries["get_ranked_chinese_chunks_query" if ranked else "get_fitting_chinese_chunks_query"]
+
+    # remove empty and duplicate keywords while keeping their order
+    keywords = list(dict.fromkeys(keyword for keyword in keywords if len(keyword) > 0))
+    if len(keywords) == 0:
+        return []
 
-    conn, cur = establish_connection()
-   
     # fuzzy text search
-    fuzzy_res = []
-    try:
-        for keyword in keywords:
-            if len(keyword) == 0:
-                continue
-            try:
-                cur.execute(get_query, (f"%{keyword}%",))
-            except DatabaseError as e:
-                print(f"database error while trying to run SQL on postgre database: {e}")
-                conn.rollback()
-                raise
-            except ProgrammingError as e:
-                print(f"programming error while trying to run SQL on postgre database: {e}")
-                conn.rollback()
-                raise
-            except Exception as e:
-                print(f"unexpected error: {e}")
-                conn.rollback()
-                raise
-            results = cur.fetchall()
-            fuzzy_res.extend([row + (keyword,) for row in results])
-    finally:
-        cur.close()
-        conn.close()
+    with get_connection() as (conn, cur):
+        try:
+            cur.execute(get_query, (keywords,))
+        except DatabaseError as e:
+            print(f"database error while trying to run SQL on postgre database: {e}")
+            conn.rollback()
+            raise
+        except ProgrammingError as e:
+            print(f"programming error while trying to run SQL on postgre database: {e}")
+            conn.rollback()
+            raise
+        except Exception as e:
+            print(f"unexpected error: {e}")
+            conn.rollback()
+            raise
+        fuzzy_res = cur.fetchall()
     
     return fuzzy_res
+
+
+def upload_mrl_values(
+        mrl_df: pd.DataFrame
+) -> None:
+    """
+    Uploads the MRL values parsed from the tables of a document. Replaces the stored values of each pesticide, 
+    unless they stem from a newer version of the document.
+
+    Args:
+        mrl_df (pd.DataFrame): DataFrame with the columns [pesticide, food, category, mrl, version, uncertain], 
+            as returned by `chunk_mrl_tables()`.
+
+    Returns:
+        None
+    """
+    ## faulty argument handling
+    if not isinstance(mrl_df, pd.DataFrame):
+        raise TypeError(f"'mrl_df' must be a pd.DataFrame, got {type(mrl_df).__name__}")
+    if mrl_df.empty:
+        return
+
+    with open(settings.query_path, "r", encoding="utf-8") as f:
+        queries = yaml.safe_load(f)
+
+    ensure_tables(["chinese_mrl_values"])
+
+    with get_connection() as (conn, cur):
+        try:
+            _replace_mrl_values(cur, queries, mrl_df)
+            conn.commit()
+        except DatabaseError as e:
+            print(f"database error while trying to run SQL on postgre database: {e}")
+            conn.rollback()
+            raise
+        except ProgrammingError as e:
+            print(f"programming error while trying to run SQL on postgre database: {e}")
+            conn.rollback()
+            raise
+        except Exception as e:
+            print(f"unexpected error: {e}")
+            conn.rollback()
+            raise
+
+
+def upload_document_chapters(
+        batches: Iterable[tuple[pd.DataFrame, pd.DataFrame]]
+) -> None:
+    """
+    Uploads the chapters and parsed MRL values of a document batch by batch within a single transaction, so the 
+    database holds either all chapters of the new document version or none of them, even if the upload fails 
+    halfway through. Batches are written as soon as they are produced, so they don't have to be held in memory.
+
+    Args:
+        batches (Iterable[tuple[pd.DataFrame, pd.DataFrame]]): Chapters in the format of `upload_dataframe()` and 
+            their MRL values in the format of `upload_mrl_values()`, one tuple per batch.
+
+    Returns:
+        None
+    """
+    with open(settings.query_path, "r", encoding="utf-8") as f:
+        queries = yaml.safe_load(f)
+
+    ensure_tables(["chinese_mrl_values"])
+
+    with get_connection() as (conn, cur):
+        try:
+            for chunk_df, mrl_df in batches:
+                _upsert_chunks(cur, queries["upsert_chinese_query"], chunk_df)
+                _replace_mrl_values(cur, queries, mrl_df)
+            conn.commit()
+        except DatabaseError as e:
+            print(f"database error while trying to run SQL on postgre database: {e}")
+            conn.rollback()
+            raise
+        except ProgrammingError as e:
+            print(f"programming error while trying to run SQL on postgre database: {e}")
+            conn.rollback()
+            raise
+        except Exception as e:
+            print(f"unexpected error: {e}")
+            conn.rollback()
+            raise
+
+
+def _upsert_chunks(
+        cur: psycopg2.extensions.cursor,
+        upsert_query: str,
+        df: pd.DataFrame
+) -> None:
+    """
+    Helper function that upserts chapters without committing them.
+
+    Args:
+        cur (psycopg2.extensions.cursor): Cursor of the transaction the chapters are written in.
+        upsert_query (str): The "upsert_chinese_query".
+        df (pd.DataFrame): Chapters with the columns [pesticide, text, version].
+
+    Returns:
+        None
+    """
+    # turn dataframe into list, dataframe must have the specified columns!
+    data = [(row['pesticide'], row['text'], row['version']) for _, row in df.iterrows()]
+    execute_values(cur, upsert_query, data)
+
+
+def _replace_mrl_values(
+        cur: psycopg2.extensions.cursor,
+        queries: dict,
+        mrl_df: pd.DataFrame
+) -> None:
+    """
+    Helper function that replaces the stored MRL values of each pesticide without committing them, unless they 
+    stem from a newer version of the document.
+
+    Args:
+        cur (psycopg2.extensions.cursor): Cursor of the transaction the values are written in.
+        queries (dict): Loaded query file.
+        mrl_df (pd.DataFrame): DataFrame as returned by `chunk_mrl_tables()`.
+
+    Returns:
+        None
+    """
+    if mrl_df.empty:
+        return
+    pesticide_versions = mrl_df[["pesticide", "version"]].drop_duplicates()
+    cur.execute(
+        queries["delete_chinese_mrl_values_query"],
+        (pesticide_versions["pesticide"].tolist(), pesticide_versions["version"].tolist())
+    )
+    # pesticides which still have values are stored in a newer version
+    cur.execute(queries["get_stored_chinese_mrl_pesticides_query"], (pesticide_versions["pesticide"].tolist(),))
+    newer_pesticides = {row[0] for row in cur.fetchall()}
+    data = [
+        (pesticide, food, category, None if pd.isna(mrl) else float(mrl), version, bool(uncertain))
+        for pesticide, food, category, mrl, version, uncertain in mrl_df[
+            ["pesticide", "food", "category", "mrl", "version", "uncertain"]
+        ].itertuples(index=False)
+        if pesticide not in newer_pesticides
+    ]
+    if data:
+        execute_values(cur, queries["insert_chinese_mrl_values_query"], data)
+
+
+def get_parsed_pesticides(
+        pesticides: list[str]
+) -> set[str]:
+    """
+    Returns the pesticides whose MRL values can be looked up with `query_mrl_values()`, because their tables 
+    were parsed completely and from the same document version as their stored chapter.
+
+    Args:
+        pesticides (list[str]): Names of the pesticides to check.
+
+    Returns:
+        set[str]: Names of the pesticides with reliably parsed values.
+    """
+    with open(settings.query_path, "r", encoding="utf-8") as f:
+        queries = yaml.safe_load(f)
+
+    ensure_tables(["chinese_mrl_values"])
+
+    with get_connection() as (conn, cur):
+        try:
+            cur.execute(queries["get_parsed_chinese_pesticides_query"], (list(pesticides),))
+            res = cur.fetchall()
+        except DatabaseError as e:
+            print(f"database error while trying to run SQL on postgre database: {e}")
+            conn.rollback()
+            raise
+        except ProgrammingError as e:
+            print(f"programming error while trying to run SQL on postgre database: {e}")
+            conn.rollback()
+            raise
+        except Exception as e:
+            print(f"unexpected error: {e}")
+            conn.rollback()
+            raise
+
+    return {row[0] for row in res}
+
+
+def query_mrl_values(
+        chunks: list[tuple[str, str, list[str]]]
+) -> list[tuple[str, str, float, str]]:
+    """
+    Looks up the parsed MRL values matching the keywords found in the given chunks.
+
+    A keyword naming the pesticide of a chunk selects all of its values, otherwise the foods whose name 
+    contains the keyword as a word (plurals included) and all foods of such categories are selected.
+
+    Args:
+        chunks (list[tuple[str, str, list[str]]]): Rows as returned by `query_database()`.
+
+    Returns:
+        list[tuple[str, str, float, str]]: Rows of pesticide, food, MRL and the keyword they were selected by, 
+        categories have -2 as MRL. Ordered by the chunks and their keywords.
+    """
+    pairs = [(pesticide, keyword) for pesticide, _, keywords in chunks for keyword in keywords]
+    if len(pairs) == 0:
+        return []
+
+    with open(settings.query_path, "r", encoding="utf-8") as f:
+        queries = yaml.safe_load(f)
+
+    ensure_tables(["chinese_mrl_values"])
+
+    with get_connection() as (conn, cur):
+        try:
+            cur.execute(queries["get_chinese_mrl_values_query"], (
+                [pesticide for pesticide, _ in pairs],
+                [keyword for _, keyword in pairs],
+                [_keyword_pattern(keyword) for _, keyword in pairs]
+            ))
+            res = cur.fetchall()
+        except DatabaseError as e:
+            print(f"database error while trying to run SQL on postgre database: {e}")
+            conn.rollback()
+            raise
+        except ProgrammingError as e:
+            print(f"programming error while trying to run SQL on postgre database: {e}")
+            conn.rollback()
+            raise
+        except Exception as e:
+            print(f"unexpected error: {e}")
+            conn.rollback()
+            raise
+
+    return res
+
+
+def _keyword_pattern(
+        keyword: str
+) -> str:
+    """
+    Helper function that turns a keyword into a PostgreSQL regular expression matching it as whole words, 
+    optionally followed by a plural "s" or "es".
+
+    Args:
+        keyword (str): Keyword given by the user.
+
+    Returns:
+        str: The regular expression.
+    """
+    # in PostgreSQL regular expressions a backslash followed by a non-alphanumeric character matches that character
+    words = ["".join(c if c.isalnum() else "\\" + c for c in word) for word in keyword.split()]
+    return r"\m" + r"\s+".join(words) + r"(e?s)?\M"
@@ -1,12 +1,13 @@
 """
 Functions for saving, updating, and retrieving EU DataLake data in a PostgreSQL database.
 """
+import logging
 import pandas as pd
 import yaml
 from config.load_config import settings
 from psycopg2 import DatabaseError, ProgrammingError
-from psycopg2.extras import execute_values
-from .util_postgres_store import establish_connection, get_data
+from .eu_reference_index import get_eu_reference_index
+from .util_postgres_store import ensure_tables, get_connection, get_data, to_copy_buffer, to_sql_text
 
 
 def get_pesticide_data(
@@ -15,39 +16,17 @@ def get_pesticide_data(
     """
     Fetches all data from the EU DataLake database for specified pesticides.
 
+    The entries are served by the EU reference index, which only reads the database again once the stored 
+    EU data changed.
+
     Args:
         pesticide_list (list[str]): List of pesticide names to retrieve data for.
 
     Returns:
         dict: Mapping of pesticide names to their full database records.
     """
-    with open(settings.query_path, "r", encoding="utf-8") as f:
-        queries = yaml.safe_load(f)
-    query = queries["get_relevant_applicable_entries_eu"]
-    conn, cur = establish_connection()
-
-    pesticide_dict = {}
-    try:
-        for pesticide in pesticide_list:
-            try: 
-                cur.execute(query, (pesticide.strip(),))
-                res = cur.fetchall()
-                pesticide_dict[pesticide] = res
-            except DatabaseError as e:
-                print(f"database error while trying to run SQL on postgre database: {e}")
-                conn.rollback()
-                raise
-            except ProgrammingError as e:
-                print(f"programming error while trying to run SQL on postgre database: {e}")
-                conn.rollback()
-                raise
-            except Exception as e:
-                print(f"unexpected error: {e}")
-                conn.rollback()
-                raise
-    finally:
-        cur.close()
-        conn.close()
+    eu_reference_index = get_eu_reference_index()
+    pesticide_dict = {pesticide: eu_reference_index.get_mrl_rows(pesticide) for pesticide in pesticide_list}
     
     # remove empty values
     filtered_pesticide_dict = {k: v for k, v in pesticide_dict.items() if v}
@@ -59,64 +38,177 @@ def store_pesticide_data(
         not_yet_applicable_data: pd.DataFrame,
 ) -> None:
     """
-    Stores cleaned EU DataLake data in a PostgreSQL database.
+    Stores cleaned EU DataLake data in a PostgreSQL database, replacing all existing entries.
 
-    First clears existing entries and resets the ID sequence, then inserts the new applicable data.
+    Streams all rows into a staging table using COPY, indexes it and swaps it in for the existing table within 
+    a single transaction. Concurrent readers therefore see either the complete old or the complete new data, 
+    never a partially loaded table. IDs start at 1 again, applicable data comes first. The EU dataset version 
+    is stamped in the same transaction.
 
     Args:
         applicable_data (pd.DataFrame): DataFrame with applicable entries. 
-        Must include: pesticide_residue_name, product_name, mrl_value_only, applicability_text, application_date.
+        Must include: pesticide_residue_name, product_code, product_name, mrl_value_only, applicability_text, application_date.
         not_yet_applicable_data (pd.DataFrame): DataFrame with not yet applicable entries. 
-        Must include: pesticide_residue_name, product_name, mrl_value_only, applicability_text, application_date.
+        Must include: pesticide_residue_name, product_code, product_name, mrl_value_only, applicability_text, application_date.
 
     Returns:
         None
     """
     with open(settings.query_path, "r", encoding="utf-8") as f:
         queries = yaml.safe_load(f)
-    insert_query = queries["insert_eu_query"]
-    truncate_query = queries["truncate_eu_query"]
-    conn, cur = establish_connection()
-
-    # clear database of old data and reset the sequence for the automated id's
-    try: 
-        cur.execute(truncate_query)
-    except DatabaseError as e:
-        print(f"database error while trying to run SQL on postgre database: {e}")
-        conn.rollback()
-        raise
-    except ProgrammingError as e:
-        print(f"programming error while trying to run SQL on postgre database: {e}")
-        conn.rollback()
-        raise
-    except Exception as e:
-        print(f"unexpected error: {e}")
-        conn.rollback()
-        raise
-
-    try:
-        for df in [applicable_data, not_yet_applicable_data]:
-            # turn dataframe into list, dataframe must have the specified columns!
-            data = [(row['pesticide_residue_name'].strip(), row['product_name'].strip(), row['mrl_value_only'], row["applicability_text"].strip(), row["application_date"]) for _, row in df.iterrows()]
-            # run SQL with data on database
-            try:
-                execute_values(cur, insert_query, data)
-                conn.commit()
-            except DatabaseError as e:
-                print(f"database error while trying to run SQL on postgre database: {e}")
-                conn.rollback()
-                raise
-            except ProgrammingError as e:
-                print(f"programming error while trying to run SQL on postgre database: {e}")
-                conn.rollback()
-                raise
-            except Exception as e:
-                print(f"unexpected error: {e}")
+
+    rows = _prepare_rows(applicable_data, not_yet_applicable_data)
+    rows.insert(0, "id", range(1, len(rows) + 1))
+
+    ensure_tables(["eu_dataset_version", "pesticide_bridge"])
+
+    with get_connection() as (conn, cur):
+        try:
+            cur.execute(queries["create_eu_staging_table_query"])
+            cur.copy_expert(queries["copy_eu_staging_query"], to_copy_buffer(rows))
+            cur.execute(queries["index_eu_staging_table_query"])
+            cur.execute(queries["swap_eu_staging_table_query"])
+            cur.execute(queries["stamp_eu_dataset_query"])
+            conn.commit()
+        except DatabaseError as e:
+            print(f"database error while trying to run SQL on postgre database: {e}")
+            conn.rollback()
+            raise
+        except ProgrammingError as e:
+            print(f"programming error while trying to run SQL on postgre database: {e}")
+            conn.rollback()
+            raise
+        except Exception as e:
+            print(f"unexpected error: {e}")
+            conn.rollback()
+            raise
+
+
+def sync_pesticide_data(
+        applicable_data: pd.DataFrame,
+        not_yet_applicable_data: pd.DataFrame,
+) -> dict[str, int]:
+    """
+    Incrementally updates the stored EU DataLake data, so the amount of written rows is proportional to the 
+    changes between two DataLake releases instead of the size of the dataset.
+
+    Rows are matched by a stable key built from pesticide, product, applicability and application date, and 
+    compared by a hash of their content. Only new rows are inserted, changed rows updated and vanished rows 
+    deleted, all within a single transaction which also stamps the EU dataset version. Falls back to 
+    `store_pesticide_data()` if the table is empty or was filled before row keys existed.
+
+    Args:
+        applicable_data (pd.DataFrame): DataFrame with applicable entries. 
+        Must include: pesticide_residue_name, product_code, product_name, mrl_value_only, applicability_text, application_date.
+        not_yet_applicable_data (pd.DataFrame): DataFrame with not yet applicable entries. 
+        Must include: pesticide_residue_name, product_code, product_name, mrl_value_only, applicability_text, application_date.
+
+    Returns:
+        dict[str, int]: Number of "inserted", "updated" and "deleted" rows.
+    """
+    with open(settings.query_path, "r", encoding="utf-8") as f:
+        queries = yaml.safe_load(f)
+
+    rows = _prepare_rows(applicable_data, not_yet_applicable_data)
+
+    ensure_tables(["eu_dataset_version", "pesticide_bridge"])
+
+    with get_connection() as (conn, cur):
+        try:
+            cur.execute(queries["get_eu_row_hashes_query"])
+            stored = pd.DataFrame(cur.fetchall(), columns=["id", "row_key", "row_hash"])
+            if stored.empty or stored["row_key"].isna().any():
                 conn.rollback()
-                raise
-    finally:
-        cur.close()
-        conn.close()
+                full_reload = True
+            else:
+                full_reload = False
+                ## diff new rows against stored ones
+                diff = rows.merge(stored, on="row_key", how="outer", suffixes=("", "_stored"), indicator=True)
+                inserts = diff.loc[diff["_merge"] == "left_only", rows.columns]
+                deletes = diff.loc[diff["_merge"] == "right_only", "id"]
+                updates = diff.loc[(diff["_merge"] == "both") & (diff["row_hash"] != diff["row_hash_stored"]), ["row_key", "mrl", "row_hash"]]
+
+                ## apply changes
+                if not deletes.empty:
+                    cur.execute(queries["delete_eu_rows_query"], ([int(row_id) for row_id in deletes],))
+                if not updates.empty:
+                    cur.execute(queries["create_eu_updates_table_query"])
+                    cur.copy_expert(queries["copy_eu_updates_query"], to_copy_buffer(updates))
+                    cur.execute(queries["apply_eu_updates_query"])
+                if not inserts.empty:
+                    cur.copy_expert(queries["copy_eu_inserts_query"], to_copy_buffer(inserts))
+                cur.execute(queries["stamp_eu_dataset_query"])
+                conn.commit()
+        except DatabaseError as e:
+            print(f"database error while trying to run SQL on postgre database: {e}")
+            conn.rollback()
+            raise
+        except ProgrammingError as e:
+            print(f"programming error while trying to run SQL on postgre database: {e}")
+            conn.rollback()
+            raise
+        except Exception as e:
+            print(f"unexpected error: {e}")
+            conn.rollback()
+            raise
+
+    if full_reload:
+        logging.info("No stored rows with row keys found, doing a full reload instead of an incremental update.")
+        store_pesticide_data(applicable_data, not_yet_applicable_data)
+        return {"inserted": len(rows), "updated": 0, "deleted": len(stored)}
+
+    return {"inserted": len(inserts), "updated": len(updates), "deleted": len(deletes)}
+
+
+def _prepare_rows(
+        applicable_data: pd.DataFrame,
+        not_yet_applicable_data: pd.DataFrame,
+) -> pd.DataFrame:
+    """
+    Helper function that brings the cleaned EU DataLake data into the column layout of the database table 
+    and adds a stable row key and a content hash to each row.
+
+    Args:
+        applicable_data (pd.DataFrame): DataFrame with applicable entries.
+        not_yet_applicable_data (pd.DataFrame): DataFrame with not yet applicable entries.
+
+    Returns:
+        pd.DataFrame: Rows with the columns: pesticide, product_code, product, mrl, applicability, 
+        application_date, row_key, row_hash.
+    """
+    # dataframes must have the specified columns! categorical columns are turned back into plain values
+    data = pd.concat([applicable_data, not_yet_applicable_data], ignore_index=True)
+    rows = pd.DataFrame({
+        "pesticide": data["pesticide_residue_name"].astype(object).str.strip(),
+        "product_code": data["product_code"].astype(object),
+        "product": data["product_name"].astype(object).str.strip(),
+        "mrl": data["mrl_value_only"],
+        "applicability": data["applicability_text"].astype(object).str.strip(),
+        # missing dates are stored as NULL
+        "application_date": data["application_date"].astype(object).where(data["application_date"].notna(), None)
+    })
+
+    # the key identifies a row across DataLake releases, duplicates are told apart by their occurrence
+    key_hash = pd.util.hash_pandas_object(
+        rows[["pesticide", "product_code", "product", "applicability", "application_date"]].astype(object), 
+        index=False
+    )
+    # the hash covers everything not contained in the key, compared as it is stored in the database
+    content = rows["mrl"].astype(object).map(to_sql_text)
+    content_hash = pd.util.hash_pandas_object(content, index=False)
+    # duplicates are counted in the order of their content, not of the dump, so a release reordering them 
+    # doesn't swap their keys
+    occurrence = (
+        pd.DataFrame({"key": key_hash, "content": content_hash})
+        .sort_values(["key", "content"], kind="stable")
+        .groupby("key")
+        .cumcount()
+        .sort_index()
+    )
+    rows["row_key"] = key_hash.map("{:016x}".format) + "-" + occurrence.astype(str)
+    rows["row_hash"] = content_hash.map("{:016x}".format)
+
+    return rows
 
 
 def get_all_pesticides() -> list:
@@ -0,0 +1,233 @@
+"""
+In-process reference index of the EU DataLake data stored in the PostgreSQL database.
+
+The index holds all EU pesticide names, their lowercased words and the applicable MRL entries of every
+pesticide. It is versioned by the EU dataset stamp (see `stamp_eu_dataset_query`) and only rebuilt once the
+stamp changes. Each built index is also written next to the EU snapshot, as plain data (JSON and Parquet), so new 
+processes can load it instead of scanning the EU table again.
+"""
+import json
+import logging
+import os
+import threading
+import pandas as pd
+import yaml
+from pathlib import Path
+from config.load_config import settings
+from psycopg2 import DatabaseError, ProgrammingError
+from .util_postgres_store import ensure_tables, get_connection, get_data
+
+_INDEX_NAMES_FILE = "reference_index_names.json"
+_INDEX_ENTRIES_FILE = "reference_index_entries.parquet"
+
+
+class EUReferenceIndex:
+    """
+    Read-only view of the stored EU data for pesticide matching and MRL lookups.
+
+    Args:
+        stamp (str | None): Version of the EU data the index was built from, None if the data wasn't stamped yet.
+        names (list[str]): Unique, stripped names of all EU pesticides.
+        mrl_rows (dict): Applicable entries in the format {pesticide: [(pesticide, product, mrl), ...]},
+            in the order of the EU DataLake.
+    """
+    def __init__(
+            self,
+            stamp: str | None,
+            names: list[str],
+            mrl_rows: dict
+    ) -> None:
+        self.stamp = stamp
+        self.names = names
+        self.name_tokens = [[word.lower() for word in name.split()] for name in names]
+        self.mrl_rows = mrl_rows
+
+    def get_mrl_rows(
+            self,
+            pesticide: str
+    ) -> list[tuple]:
+        """
+        Returns the applicable entries of a pesticide.
+
+        Args:
+            pesticide (str): Name of the EU pesticide, surrounding whitespace is ignored.
+
+        Returns:
+            list[tuple]: Entries in the format (pesticide, product, mrl), empty if there are none.
+        """
+        return self.mrl_rows.get(pesticide.strip(), [])
+
+
+_eu_reference_index = None
+_eu_reference_index_lock = threading.Lock()
+
+
+def get_eu_reference_index() -> EUReferenceIndex:
+    """
+    Returns the reference index of the current EU data, loading or building it if the EU data changed since
+    it was last built.
+
+    Returns:
+        EUReferenceIndex: Index matching the stored EU data.
+    """
+    global _eu_reference_index
+    with open(settings.query_path, "r", encoding="utf-8") as f:
+        queries = yaml.safe_load(f)
+    ensure_tables(["eu_dataset_version"])
+    stamp = _format_stamp(get_data(queries["get_eu_dataset_stamp_query"]))
+
+    with _eu_reference_index_lock:
+        # unstamped data can't be told apart from other unstamped data, so it's never reused
+        if stamp is not None and _eu_reference_index is not None and _eu_reference_index.stamp == stamp:
+            return _eu_reference_index
+
+        index = _load_index_file(stamp) if stamp is not None else None
+        if index is None:
+            index = _build_index(queries)
+            logging.info(f"Built EU reference index with {len(index.names)} pesticides.")
+            if index.stamp is not None:
+                _save_index_file(index)
+        _eu_reference_index = index
+    return index
+
+
+def _format_stamp(
+        res: list
+) -> str | None:
+    """
+    Helper function that turns the row of the EU dataset stamp into a single string.
+
+    Args:
+        res (list): Result of `get_eu_dataset_stamp_query`.
+
+    Returns:
+        str | None: The stamp, None if the EU data wasn't stamped yet.
+    """
+    if not res:
+        return None
+    pesticide_list_hash, loaded_at = res[0]
+    return f"{pesticide_list_hash}/{loaded_at.isoformat()}"
+
+
+def _build_index(
+        queries: dict
+) -> EUReferenceIndex:
+    """
+    Helper function that builds the index from the database. The stamp and the data are read within a single
+    snapshot of the database, so the index never mixes two EU data loads.
+
+    Args:
+        queries (dict): Loaded query file.
+
+    Returns:
+        EUReferenceIndex: The new index.
+    """
+    with get_connection() as (conn, cur):
+        try:
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            cur.execute(queries["get_eu_dataset_stamp_query"])
+            stamp = _format_stamp(cur.fetchall())
+            cur.execute(queries["get_unique_pesticides_eu"])
+            pesticides = cur.fetchall()
+            cur.execute(queries["get_applicable_entries_eu"])
+            entries = cur.fetchall()
+            conn.commit()
+        except DatabaseError as e:
+            print(f"database error while trying to run SQL on postgre database: {e}")
+            conn.rollback()
+            raise
+        except ProgrammingError as e:
+            print(f"programming error while trying to run SQL on postgre database: {e}")
+            conn.rollback()
+            raise
+        except Exception as e:
+            print(f"unexpected error: {e}")
+            conn.rollback()
+            raise
+
+    names = list(dict.fromkeys(row[0].strip() for row in pesticides))
+    return _make_index(stamp, names, entries)
+
+
+def _make_index(
+        stamp: str | None,
+        names: list[str],
+        entries: list[tuple]
+) -> EUReferenceIndex:
+    """
+    Helper function that groups the applicable entries by pesticide and creates the index.
+
+    Args:
+        stamp (str | None): Version of the EU data the entries were read from.
+        names (list[str]): Unique, stripped names of all EU pesticides.
+        entries (list[tuple]): Applicable entries in the format (pesticide, product, mrl), grouped by pesticide.
+
+    Returns:
+        EUReferenceIndex: The new index.
+    """
+    # rows arrive grouped by pesticide, the few distinct products are shared instead of kept once per row
+    products = {}
+    mrl_rows = {}
+    for pesticide, product, mrl in entries:
+        product = products.setdefault(product, product)
+        mrl_rows.setdefault(pesticide, []).append((pesticide, product, mrl))
+    return EUReferenceIndex(stamp, names, mrl_rows)
+
+
+def _load_index_file(
+        stamp: str
+) -> EUReferenceIndex | None:
+    """
+    Helper function that loads the index written by an earlier process. Both files carry the stamp they were 
+    written for, so files of two different EU data loads are never combined.
+
+    Args:
+        stamp (str): Stamp of the current EU data.
+
+    Returns:
+        EUReferenceIndex | None: The index, None if there is none, it belongs to other EU data or can't be read.
+    """
+    path = Path(settings.eu_snapshot_dir)
+    if not (path / _INDEX_NAMES_FILE).is_file() or not (path / _INDEX_ENTRIES_FILE).is_file():
+        return None
+    try:
+        with open(path / _INDEX_NAMES_FILE, "r", encoding="utf-8") as f:
+            names_file = json.load(f)
+        entries_df = pd.read_parquet(path / _INDEX_ENTRIES_FILE)
+        if names_file["stamp"] != stamp or (entries_df["stamp"] != stamp).any():
+            return None
+        names = [str(name) for name in names_file["names"]]
+        entries = list(entries_df[["pesticide", "product", "mrl"]].astype(object).itertuples(index=False, name=None))
+    except Exception as e:
+        # whatever is wrong with the files, the index can always be rebuilt from the database
+        logging.warning(f"Couldn't load EU reference index from {path}, rebuilding it: {e}")
+        return None
+    return _make_index(stamp, names, entries)
+
+
+def _save_index_file(
+        index: EUReferenceIndex
+) -> None:
+    """
+    Helper function that writes the index for later processes. The files are replaced atomically, so concurrent
+    processes never read a partially written index.
+
+    Args:
+        index (EUReferenceIndex): Index to write.
+
+    Returns:
+        None
+    """
+    path = Path(settings.eu_snapshot_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    entries = [entry for pesticide_entries in index.mrl_rows.values() for entry in pesticide_entries]
+    entries_df = pd.DataFrame(entries, columns=["pesticide", "product", "mrl"], dtype=object)
+    entries_df.insert(0, "stamp", index.stamp)
+
+    tmp_path = path / f"{_INDEX_ENTRIES_FILE}.{os.getpid()}.tmp"
+    entries_df.to_parquet(tmp_path, compression="zstd")
+    os.replace(tmp_path, path / _INDEX_ENTRIES_FILE)
+    tmp_path = path / f"{_INDEX_NAMES_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"stamp": index.stamp, "names": index.names}, f)
+    os.replace(tmp_path, path / _INDEX_NAMES_FILE)
@@ -1,9 +1,21 @@
 """
 Utility functions for PostgreSQL in Python, including connecting to the database and querying data.
 """
+import atexit
+import io
+import logging
+import math
+import pandas as pd
 import psycopg2
+import threading
+import yaml
+from collections.abc import Iterator
+from contextlib import contextmanager
+from decimal import Decimal
 from config.load_config import settings
-from psycopg2 import OperationalError, DatabaseError, ProgrammingError
+from psycopg2 import OperationalError, DatabaseError, ProgrammingError, InterfaceError
+from psycopg2.extensions import STATUS_READY
+from psycopg2.pool import ThreadedConnectionPool
 
 
 def establish_connection() -> tuple[psycopg2.extensions.connection, psycopg2.extensions.cursor]:
@@ -34,6 +46,116 @@ def establish_connection() -> tuple[psycopg2.extensions.connection, psycopg2.ext
     return conn, cur
 
 
+_connection_pool = None
+# psycopg2 pools raise instead of waiting when all connections are in use, the semaphore makes callers wait
+_connection_slots = None
+_connection_pool_lock = threading.Lock()
+
+
+def _get_connection_pool() -> ThreadedConnectionPool:
+    """
+    Helper function that returns the process-wide connection pool, creating it on first use.
+
+    Returns:
+        ThreadedConnectionPool: Pool of connections to the configured PostgreSQL database.
+    """
+    global _connection_pool, _connection_slots
+    with _connection_pool_lock:
+        if _connection_pool is None:
+            try:
+                _connection_pool = ThreadedConnectionPool(
+                    minconn=settings.postgre_pool_min_size,
+                    maxconn=settings.postgre_pool_max_size,
+                    host=settings.postgre_host,
+                    database=settings.postgre_database_name,
+                    user=settings.postgre_username,
+                    password=settings.postgre_password,
+                    port=settings.postgre_port
+                )
+            except OperationalError as e:
+                print(f"operational error while trying to connect to postgre database: {e}")
+                raise
+            _connection_slots = threading.BoundedSemaphore(settings.postgre_pool_max_size)
+    return _connection_pool
+
+
+def _is_healthy(
+        conn: psycopg2.extensions.connection
+) -> bool:
+    """
+    Helper function that checks whether a pooled connection is still usable.
+
+    Args:
+        conn (psycopg2.extensions.connection): Connection taken out of the pool.
+
+    Returns:
+        bool: True if the connection answers a trivial query.
+    """
+    if conn.closed:
+        return False
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except (OperationalError, InterfaceError):
+        return False
+
+
+@contextmanager
+def get_connection() -> Iterator[tuple[psycopg2.extensions.connection, psycopg2.extensions.cursor]]:
+    """
+    Hands out a pooled connection and a fresh cursor, both are returned to the pool on exit.
+
+    Connections are health checked on checkout and replaced if the server closed them, an `OperationalError` 
+    is raised if not even a new connection works. Uncommitted transactions are rolled back before the 
+    connection goes back to the pool.
+
+    Yields:
+        psycopg2.extensions.connection: A psycopg2 connection object.
+        psycopg2.extensions.cursor: A psycopg2 cursor object.
+    """
+    pool = _get_connection_pool()
+    _connection_slots.acquire()
+    try:
+        # one retry per possible pooled connection, after that the pool can only hand out new connections
+        for _ in range(settings.postgre_pool_max_size + 1):
+            conn = pool.getconn()
+            if _is_healthy(conn):
+                break
+            logging.info("Discarded broken pooled database connection.")
+            pool.putconn(conn, close=True)
+        else:
+            # even a new connection is broken, the server can't be used right now
+            raise OperationalError("could not get a working connection to the postgre database")
+
+        cur = conn.cursor()
+        try:
+            yield conn, cur
+        finally:
+            cur.close()
+            if not conn.closed and conn.status != STATUS_READY:
+                conn.rollback()
+            pool.putconn(conn, close=bool(conn.closed))
+    finally:
+        _connection_slots.release()
+
+
+@atexit.register
+def close_connection_pool() -> None:
+    """
+    Closes all connections of the process-wide pool. Called automatically on interpreter shutdown.
+
+    Returns:
+        None
+    """
+    global _connection_pool
+    with _connection_pool_lock:
+        if _connection_pool is not None:
+            _connection_pool.closeall()
+            _connection_pool = None
+
+
 def get_data(
         query: str
 ) -> list:
@@ -46,25 +168,140 @@ def get_data(
     Returns:
         list: Results returned by the query.
     """
-    conn, cur = establish_connection()
+    with get_connection() as (conn, cur):
+        try: 
+            cur.execute(query)
+            conn.commit()
+            res = cur.fetchall()
+            return res
+        except DatabaseError as e:
+            print(f"database error while trying to run SQL on postgre database: {e}")
+            conn.rollback()
+            raise
+        except ProgrammingError as e:
+            print(f"programming error while trying to run SQL on postgre database: {e}")
+            conn.rollback()
+            raise
+        except Exception as e:
+            print(f"unexpected error: {e}")
+            conn.rollback()
+            raise
 
-    try: 
-        cur.execute(query)
-        conn.commit()
-        res = cur.fetchall()
-        return res
-    except DatabaseError as e:
-        print(f"database error while trying to run SQL on postgre database: {e}")
-        conn.rollback()
-        raise
-    except ProgrammingError as e:
-        print(f"programming error while trying to run SQL on postgre database: {e}")
-        conn.rollback()
-        raise
-    except Exception as e:
-        print(f"unexpected error: {e}")
-        conn.rollback()
-        raise
-    finally:
-        cur.close()
-        conn.close()
+
+def execute_statements(
+        statements: list[str],
+        single_transaction: bool = True
+) -> None:
+    """
+    Executes a list of SQL statements without parameters and without results, e.g. schema migrations.
+
+    Args:
+        statements (list[str]): The SQL statements to execute, in order.
+        single_transaction (bool): Whether all statements are committed together. If False, every statement runs 
+            in autocommit mode, which is required for statements like "REINDEX ... CONCURRENTLY". Defaults to True.
+
+    Returns:
+        None
+    """
+    with get_connection() as (conn, cur):
+        conn.autocommit = not single_transaction
+        try:
+            for statement in statements:
+                cur.execute(statement)
+            conn.commit()
+        except DatabaseError as e:
+            print(f"database error while trying to run SQL on postgre database: {e}")
+            conn.rollback()
+            raise
+        except ProgrammingError as e:
+            print(f"programming error while trying to run SQL on postgre database: {e}")
+            conn.rollback()
+            raise
+        except Exception as e:
+            print(f"unexpected error: {e}")
+            conn.rollback()
+            raise
+        finally:
+            conn.autocommit = False
+
+
+_ensured_tables = set()
+_ensured_tables_lock = threading.Lock()
+
+
+def ensure_tables(
+        tables: list[str]
+) -> None:
+    """
+    Creates the given tables unless they exist, so databases set up before the tables were added keep working 
+    without running the migrations of `python chiprag.py db` first. Each table is only checked once per process.
+
+    Args:
+        tables (list[str]): Names of tables defined in `store_tables` of the query file.
+
+    Returns:
+        None
+    """
+    with _ensured_tables_lock:
+        missing = [table for table in tables if table not in _ensured_tables]
+        if not missing:
+            return
+        with open(settings.query_path, "r", encoding="utf-8") as f:
+            queries = yaml.safe_load(f)
+        execute_statements([statement for table in missing for statement in queries["store_tables"][table]])
+        _ensured_tables.update(missing)
+
+
+def to_sql_text(
+        value: object
+) -> str | None:
+    """
+    Turns a single value into the text PostgreSQL would store for it in a TEXT column 
+    when inserted through psycopg2, e.g. 1e-05 -> "0.00001" and NaN -> "NaN".
+
+    Args:
+        value (object): Value of a DataFrame cell.
+
+    Returns:
+        str | None: Text representation of the value, None for SQL NULL.
+    """
+    if value is None:
+        return None
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "NaN"
+        # psycopg2 sends floats as numeric literals, which PostgreSQL writes out without exponent
+        return format(Decimal(repr(float(value))), "f")
+    return str(value)
+
+
+def to_copy_buffer(
+        df: pd.DataFrame
+) -> io.StringIO:
+    """
+    Serializes a DataFrame into PostgreSQL's COPY text format, to be used with `cursor.copy_expert()`.
+
+    Values are stored exactly as if they had been inserted row by row through psycopg2.
+
+    Args:
+        df (pd.DataFrame): DataFrame whose columns are in the order of the COPY column list.
+
+    Returns:
+        io.StringIO: Buffer holding one line per row, positioned at its start.
+    """
+    if df.empty:
+        return io.StringIO("")
+
+    columns = []
+    for column in df.columns:
+        values = df[column].astype(object).map(to_sql_text)
+        escaped = (
+            values.str.replace("\\", "\\\\", regex=False)
+            .str.replace("\t", "\\t", regex=False)
+            .str.replace("\n", "\\n", regex=False)
+            .str.replace("\r", "\\r", regex=False)
+        )
+        columns.append(escaped.fillna("\\N"))
+    lines = columns[0].str.cat(columns[1:], sep="\t")
+
+    return io.StringIO("\n".join(lines) + "\n")
@@ -8,16 +8,41 @@ class Settings(BaseSettings):
     postgre_database_name: str = Field(..., alias="DATABASE_NAME")
     postgre_host: str = Field(..., alias="HOST_URL")
     postgre_port: int = Field(..., alias="PORT")
+    postgre_pool_min_size: int = Field(1, alias="POOL_MIN_SIZE", ge=0)
+    postgre_pool_max_size: int = Field(10, alias="POOL_MAX_SIZE", ge=1)
 
     # --- Kipitz / OpenAI API ---
     kipitz_api_token: str = Field(..., alias="KIPITZ_API_TOKEN")
     kipitz_base_url: str = Field(..., alias="BASE_URL")
     kipitz_model: str = Field(..., alias="MODEL")
     kipitz_role: str = Field(..., alias="ROLE")
+    llm_max_workers: int = Field(8, alias="LLM_MAX_WORKERS", ge=1)
+    comparison_queue_size: int = Field(16, alias="COMPARISON_QUEUE_SIZE", ge=1)
+    food_matching_enabled: bool = Field(True, alias="FOOD_MATCHING_ENABLED")
+    llm_requests_per_minute: int = Field(0, alias="LLM_REQUESTS_PER_MINUTE", ge=0)
+    llm_tokens_per_minute: int = Field(0, alias="LLM_TOKENS_PER_MINUTE", ge=0)
+    llm_timeout_seconds: float = Field(120, alias="LLM_TIMEOUT_SECONDS", gt=0)
+    llm_max_retries: int = Field(6, alias="LLM_MAX_RETRIES", ge=0)
+    llm_backoff_base_seconds: float = Field(1, alias="LLM_BACKOFF_BASE_SECONDS", gt=0)
+    llm_backoff_max_seconds: float = Field(60, alias="LLM_BACKOFF_MAX_SECONDS", gt=0)
+
+    # --- LLM answer cache ---
+    llm_cache_enabled: bool = Field(True, alias="LLM_CACHE_ENABLED")
+    llm_cache_path: str = Field(".cache/llm_cache.sqlite3", alias="LLM_CACHE_PATH")
+    llm_cache_max_entries: int = Field(50000, alias="LLM_CACHE_MAX_ENTRIES", ge=1)
+    llm_cache_ttl_days: float = Field(30, alias="LLM_CACHE_TTL_DAYS", gt=0)
+
+    # --- EU DataLake ---
+    eu_api_url: str = Field(
+        "https://api.datalake.sante.service.ec.europa.eu/sante/pesticides/pesticide_residues_mrls/download?format=json&language=EN&api-version=v2.0",
+        alias="EU_API_URL"
+    )
+    eu_snapshot_dir: str = Field(".cache/eu_snapshot", alias="EU_SNAPSHOT_DIR")
 
     # --- Paths ---
     prompt_path: str = Field(..., alias="PROMPT_PATH")
     query_path: str = Field(..., alias="QUERY_PATH")
+    food_synonyms_path: str = Field("config/food_synonyms.yaml", alias="FOOD_SYNONYMS_PATH")
 
     class Config:
         env_file = ".env"
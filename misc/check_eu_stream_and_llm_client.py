@@ -0,0 +1,340 @@
+"""
+Runnable check of the streamed EU DataLake download and of the retrying LLM client, both against local stand-ins,
+so neither the EU DataLake nor the LLM API is needed.
+
+- `eu_fetch_api()` downloads a dump from a local HTTP server and its result is compared with the one of the old
+  `response.json()` path. A recorded dump can be given with `--dump`, otherwise a synthetic one is generated.
+- `LLMClient` is driven against a fake OpenAI API answering with 429 when too many requests arrive at once and
+  with 503 now and then. The check asserts that every request is retried until it succeeds, that the number of
+  concurrent requests shrinks and that permanent errors and exhausted retries are raised.
+
+Run it from the root of the repository, with a configured `.env`:
+
+    python misc/check_eu_stream_and_llm_client.py [--dump path/to/recorded_dump.json]
+"""
+import argparse
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import openai
+import pandas as pd
+import requests
+from config.load_config import settings
+from chiprag.chiprag_modules.eu_data_tools import eu_fetch_api, _eu_clean_data, _iter_json_records
+from chiprag.chiprag_modules.llm_client import LLMClient
+
+
+def _start_server(
+        handler: type[BaseHTTPRequestHandler]
+) -> ThreadingHTTPServer:
+    """
+    Helper function that serves a handler on a free local port in a background thread.
+
+    Args:
+        handler (type[BaseHTTPRequestHandler]): Handler answering the requests.
+
+    Returns:
+        ThreadingHTTPServer: The running server.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+## EU DataLake download
+
+def _make_dump(
+        records: int = 20000,
+        seed: int = 0
+) -> bytes:
+    """
+    Helper function that generates a dump in the layout of the EU DataLake: a JSON array of records with more
+    columns than chipRAG uses, duplicates, missing values and non-ASCII names.
+
+    Args:
+        records (int): Number of records. Defaults to 20000.
+        seed (int): Seed of the random generator. Defaults to 0.
+
+    Returns:
+        bytes: UTF-8 encoded JSON array.
+    """
+    rnd = random.Random(seed)
+    products = [(f"{(i + 1) * 10000:07d}", f"Product {i} ({'ä' * (i % 3)}é)") for i in range(300)]
+    applicabilities = ["Applicable"] * 8 + ["No longer applicable", "Not yet applicable"]
+    dump = []
+    for _ in range(records):
+        pesticide = rnd.randrange(400)
+        product_code, product_name = rnd.choice(products)
+        dump.append({
+            "pesticide_residue_id": pesticide,
+            "pesticide_residue_name": f"Pesticide {pesticide} \"sum\" {'µ' if pesticide % 5 == 0 else ''}",
+            "product_code": product_code,
+            "product_name": product_name,
+            "mrl_value": "0.01*",
+            "mrl_value_only": rnd.choice([0.01, 0.05, 1, 2.5, 1e-05, None]),
+            "applicability_text": rnd.choice(applicabilities),
+            "application_date": rnd.choice([None, None, "2026-01-01"]),
+            "regulation_url": "https://eur-lex.europa.eu/eli/reg/2023/1"
+        })
+    # duplicates are removed by the cleaning
+    dump.extend(dump[:records // 20])
+    return json.dumps(dump, ensure_ascii=rnd.random() < 0.5, indent=None).encode("utf-8")
+
+
+def _normalize(
+        df: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Helper function that turns categorical columns and missing values into plain values for comparison.
+
+    Args:
+        df (pd.DataFrame): DataFrame returned by the download.
+
+    Returns:
+        pd.DataFrame: DataFrame with object columns and None for missing values.
+    """
+    df = df.astype(object)
+    return df.where(df.notna(), None)
+
+
+def check_eu_download(
+        dump: bytes
+) -> None:
+    """
+    Streams a dump through `eu_fetch_api()` and compares the result with the old `response.json()` path.
+
+    Args:
+        dump (bytes): JSON array in the layout of the EU DataLake.
+
+    Returns:
+        None
+    """
+    class DumpHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(dump)))
+            self.end_headers()
+            # written in small pieces, so the client receives the dump in chunks as from a real server
+            for start in range(0, len(dump), 64 * 1024):
+                self.wfile.write(dump[start:start + 64 * 1024])
+
+        def log_message(self, *args) -> None:
+            pass
+
+    # the incremental decoder on its own, with chunks splitting records and multi-byte characters
+    sample = dump[:200000]
+    sample = sample[:sample.rindex(b"},") + 1] + b"]" if len(dump) > len(sample) else sample
+    for chunk_size in (1, 7, 4096):
+        records = list(_iter_json_records(sample[start:start + chunk_size] for start in range(0, len(sample), chunk_size)))
+        assert records == json.loads(sample), f"incremental decoding differs with chunks of {chunk_size} bytes"
+
+    server = _start_server(DumpHandler)
+    settings.eu_api_url = f"http://127.0.0.1:{server.server_port}/download"
+    try:
+        started = time.perf_counter()
+        # small batches, so the dump is folded in from many batches
+        applicable_data, not_yet_applicable_data, metadata = eu_fetch_api(batch_size=1000)
+        streamed_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        old_applicable_data, old_not_yet_applicable_data = _eu_clean_data(requests.get(settings.eu_api_url).json())
+        json_seconds = time.perf_counter() - started
+
+        pd.testing.assert_frame_equal(_normalize(applicable_data), _normalize(old_applicable_data))
+        pd.testing.assert_frame_equal(_normalize(not_yet_applicable_data), _normalize(old_not_yet_applicable_data))
+        # the server sends no ETag, the unchanged dump is recognised by its content hash
+        assert eu_fetch_api(previous_metadata=metadata) is None, "unchanged dump wasn't recognised"
+    finally:
+        server.shutdown()
+
+    print(
+        f"EU download: {len(applicable_data)} applicable and {len(not_yet_applicable_data)} not yet applicable rows "
+        f"identical to response.json() (streamed {streamed_seconds:.2f}s, response.json() {json_seconds:.2f}s), "
+        f"unchanged dump skipped."
+    )
+
+
+## LLM client
+
+class _FakeLLMAPI:
+    """
+    State of the fake OpenAI API: requests beyond `capacity` at the same time are rate limited (429), every
+    `error_every`th request fails with 503 and `mode` can make every request fail.
+    """
+    capacity = 3
+    error_every = 7
+    # "normal", "rate_limited" or "bad_request"
+    mode = "normal"
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+    requests = 0
+    rate_limited = 0
+    failed = 0
+
+
+class _FakeLLMHandler(BaseHTTPRequestHandler):
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        api = _FakeLLMAPI
+        with api.lock:
+            api.requests += 1
+            api.in_flight += 1
+            api.max_in_flight = max(api.max_in_flight, api.in_flight)
+            request_number = api.requests
+            over_capacity = api.in_flight > api.capacity
+        try:
+            time.sleep(0.02)
+            if api.mode == "bad_request":
+                return self._send(400, {"error": {"message": "bad request", "type": "invalid_request_error"}})
+            if api.mode == "rate_limited" or over_capacity:
+                with api.lock:
+                    api.rate_limited += 1
+                return self._send(429, {"error": {"message": "rate limited", "type": "rate_limit"}}, {"Retry-After": "0.05"})
+            if request_number % api.error_every == 0:
+                with api.lock:
+                    api.failed += 1
+                return self._send(503, {"error": {"message": "unavailable", "type": "server_error"}})
+            self._send(200, {
+                "id": "check",
+                "object": "chat.completion",
+                "created": 0,
+                "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "echo: " + body["messages"][0]["content"]}}],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+            })
+        finally:
+            with api.lock:
+                api.in_flight -= 1
+
+    def _send(
+            self,
+            status: int,
+            body: dict,
+            headers: dict | None = None
+    ) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def check_llm_client(
+        requests_count: int = 60,
+        max_concurrency: int = 8
+) -> None:
+    """
+    Drives `LLMClient` against the fake OpenAI API and checks its retries, backoff and adaptive concurrency.
+
+    Args:
+        requests_count (int): Number of prompts sent concurrently. Defaults to 60.
+        max_concurrency (int): Concurrency limit of the client, above the capacity of the fake API. Defaults to 8.
+
+    Returns:
+        None
+    """
+    server = _start_server(_FakeLLMHandler)
+    openai_client = openai.OpenAI(base_url=f"http://127.0.0.1:{server.server_port}/v1", api_key="check", max_retries=0)
+
+    def make_client(max_retries: int) -> LLMClient:
+        return LLMClient(
+            openai_client=openai_client,
+            requests_per_minute=0,
+            tokens_per_minute=0,
+            max_concurrency=max_concurrency,
+            max_retries=max_retries,
+            backoff_base=0.01,
+            backoff_max=0.2
+        )
+
+    try:
+        ## throttled and failing requests are retried until they succeed
+        client = make_client(max_retries=30)
+        limits = []
+        release = client.concurrency.release
+
+        def recording_release(throttled: bool) -> None:
+            release(throttled)
+            limits.append(client.concurrency.limit)
+
+        client.concurrency.release = recording_release
+        answers = [None] * requests_count
+
+        def send(position: int) -> None:
+            answers[position] = client.complete("check-model", "user", f"prompt {position}")
+
+        threads = [threading.Thread(target=send, args=(position,)) for position in range(requests_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert answers == [f"echo: prompt {position}" for position in range(requests_count)], "answers don't match their prompts"
+        assert _FakeLLMAPI.rate_limited > 0 and _FakeLLMAPI.failed > 0, "the fake API neither rate limited nor failed"
+        assert client.throttled == _FakeLLMAPI.rate_limited, "not every 429 was counted as rate limited"
+        assert client.retries == _FakeLLMAPI.rate_limited + _FakeLLMAPI.failed, "not every failed request was retried"
+        assert client.requests == _FakeLLMAPI.requests, "requests were sent past the client"
+        assert min(limits) < max_concurrency, "the concurrency limit didn't shrink while the API rate limited"
+        assert _FakeLLMAPI.max_in_flight <= max_concurrency, "more requests were in flight than allowed"
+        print(
+            f"LLM client: {requests_count} prompts answered after {client.retries} retries "
+            f"({_FakeLLMAPI.rate_limited} rate limited, {_FakeLLMAPI.failed} failed), concurrency limit shrank from "
+            f"{max_concurrency} to {int(min(limits))} and grew back to {int(client.concurrency.limit)}, "
+            f"at most {_FakeLLMAPI.max_in_flight} requests in flight."
+        )
+
+        ## permanent errors are raised right away
+        _FakeLLMAPI.mode = "bad_request"
+        client = make_client(max_retries=3)
+        try:
+            client.complete("check-model", "user", "bad prompt")
+            raise AssertionError("a bad request wasn't raised")
+        except openai.BadRequestError:
+            pass
+        assert client.requests == 1 and client.retries == 0, "a bad request was retried"
+
+        ## retries are given up after max_retries
+        _FakeLLMAPI.mode = "rate_limited"
+        client = make_client(max_retries=2)
+        started = time.perf_counter()
+        try:
+            client.complete("check-model", "user", "throttled prompt")
+            raise AssertionError("exhausted retries weren't raised")
+        except openai.RateLimitError:
+            pass
+        assert client.requests == 3 and client.retries == 2, "retries weren't given up after max_retries"
+        # every retry waits at least the 0.05s the API asked for with Retry-After
+        assert time.perf_counter() - started >= 2 * 0.05, "Retry-After wasn't respected"
+        print("LLM client: bad requests are raised without retry, rate limited requests after 2 retries.")
+    finally:
+        _FakeLLMAPI.mode = "normal"
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checks the streamed EU download and the LLM client against local stand-ins.")
+    parser.add_argument("--dump", type=str, default=None, help="Recorded EU DataLake dump (JSON). Defaults to a generated dump")
+    args = parser.parse_args()
+    # every retry is logged as a warning, the checks report them in their summary instead
+    logging.getLogger().setLevel(logging.ERROR)
+
+    dump = Path(args.dump).read_bytes() if args.dump else _make_dump()
+    check_eu_download(dump)
+    check_llm_client()
+    print("All checks passed.")